@@ -2,11 +2,13 @@ from wsi_service.api.v3.singletons import localmapper
 from wsi_service.api.v3.slides import add_routes_slides
 from wsi_service.api.v3.annotations import add_routes_annotations
 from wsi_service.api.v3.local_mode import add_routes_local_mode
+from wsi_service.api.v3.status import add_routes_status
 
 
 def add_routes_v3(app, settings, slide_manager):
     add_routes_slides(app, settings, slide_manager)
     add_routes_annotations(app, settings, slide_manager)
+    add_routes_status(app, settings, slide_manager)
     if localmapper:
         slide_manager.with_local_mapper(local_mapper=localmapper)
         add_routes_local_mode(app, settings)
@@ -2,11 +2,16 @@ from typing import List, Optional
 import asyncio
 
 from fastapi import Path, Depends, Header
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from PIL import Image
 from zipfly import ZipFly
 
+from wsi_service.custom_models.channel_statistics import SlideChannelStatistics
 from wsi_service.custom_models.queries import (
+    ChannelColorsQuery,
+    ChannelCompositeQuery,
+    ChannelMaxQuery,
+    ChannelMinQuery,
     ImageChannelQuery,
     ImageFormatsQuery,
     ImagePaddingColorQuery,
@@ -20,6 +25,7 @@ from wsi_service.custom_models.responses import ImageRegionResponse, ImageRespon
 from wsi_service.models.v3.slide import SlideInfo
 from wsi_service.singletons import logger
 from wsi_service.utils.app_utils import (
+    get_channel_composition,
     make_response,
     validate_hex_color_string,
     validate_image_channels,
@@ -29,6 +35,7 @@ from wsi_service.utils.app_utils import (
     validate_image_z,
 )
 from wsi_service.custom_models.batch_queries import (
+    BatchEntryOrderQuery,
     IdListQuery,
     TileLevelListQuery,
     TileXListQuery,
@@ -36,12 +43,25 @@ from wsi_service.custom_models.batch_queries import (
     SlideListQuery,
 )
 from wsi_service.utils.app_batch_utils import (
-    batch_safe_make_response,
+    batch_cached_get_tile,
+    batch_get_thumbnail,
+    batch_stream_response,
     batch_safe_get_region,
     batch_safe_get_tile,
     safe_get_slide,
     safe_get_slide_for_query,
+    safe_get_output_type,
     safe_get_slide_info,
+    safe_get_slide_version,
+)
+from wsi_service.utils.cache_utils import (
+    EncodedImage,
+    get_encoded_padding_image,
+    make_batch_tile_cache_key,
+    make_composition_key,
+    make_region_cache_key,
+    make_thumbnail_cache_key,
+    make_tile_cache_key,
 )
 from wsi_service.utils.download_utils import (
     expand_folders,
@@ -51,9 +71,12 @@ from wsi_service.utils.download_utils import (
 from wsi_service.utils.image_utils import (
     check_complete_region_overlap,
     check_complete_tile_overlap,
+    check_region_outside_image,
+    check_tile_outside_image,
     get_extended_region,
     get_extended_tile,
 )
+from wsi_service.utils.statistics_utils import get_channel_windows
 from .singletons import api_integration
 
 try:
@@ -140,7 +163,7 @@ def add_routes_slides(app, settings, slide_manager):
         Images will be scaled to match these requirements while keeping the aspect ratio.
 
         Optionally, the image format and its quality (e.g. for jpeg) can be selected.
-        Formats include jpeg, png, tiff, bmp, gif.
+        Formats include jpeg, png, tiff, bmp, gif, webp, jp2.
         When tiff is specified as output format the raw data of the image is returned.
         """
         validate_image_request(image_format, image_quality)
@@ -151,10 +174,22 @@ def add_routes_slides(app, settings, slide_manager):
             manager=slide_manager,
             plugin=plugin,
         )
+        cache_key = make_thumbnail_cache_key(
+            slide_id, plugin, max_x, max_y, image_format, image_quality
+        )
+        slide_version = await slide_manager.get_slide_version(slide_id, plugin=plugin)
+        cached_response = await slide_manager.tile_cache.get_response(
+            cache_key, slide_version
+        )
+        if cached_response is not None:
+            log_slide_access(slide_id)
+            return cached_response
         slide = await slide_manager.get_slide(slide_id, plugin=plugin)
         thumbnail = await slide.get_thumbnail(max_x, max_y)
         log_slide_access(slide_id)
-        return make_response(slide, thumbnail, image_format, image_quality)
+        response = make_response(slide, thumbnail, image_format, image_quality)
+        slide_manager.tile_cache.put_response(cache_key, slide_version, response)
+        return response
 
     @app.get(
         "/slides/label/max_size/{max_x}/{max_y}",
@@ -177,7 +212,7 @@ def add_routes_slides(app, settings, slide_manager):
         Images will be scaled to match these requirements while keeping the aspect ratio.
 
         Optionally, the image format and its quality (e.g. for jpeg) can be selected.
-        Formats include jpeg, png, tiff, bmp, gif.
+        Formats include jpeg, png, tiff, bmp, gif, webp, jp2.
         When tiff is specified as output format the raw data of the image is returned.
         """
         validate_image_request(image_format, image_quality)
@@ -215,7 +250,7 @@ def add_routes_slides(app, settings, slide_manager):
         Images will be scaled to match these requirements while keeping the aspect ratio.
 
         Optionally, the image format and its quality (e.g. for jpeg) can be selected.
-        Formats include jpeg, png, tiff, bmp, gif.
+        Formats include jpeg, png, tiff, bmp, gif, webp, jp2.
         When tiff is specified as output format the raw data of the image is returned.
         """
         validate_image_request(image_format, image_quality)
@@ -256,6 +291,10 @@ def add_routes_slides(app, settings, slide_manager):
             gt=0, examples=[1024], description="Height of requested region"
         ),
         image_channels: List[int] = ImageChannelQuery,
+        composite: bool = ChannelCompositeQuery,
+        channel_colors: List[str] = ChannelColorsQuery,
+        channel_min: List[float] = ChannelMinQuery,
+        channel_max: List[float] = ChannelMaxQuery,
         z: int = ZStackQuery,
         padding_color: str = ImagePaddingColorQuery,
         image_format: str = ImageFormatsQuery,
@@ -287,6 +326,11 @@ def add_routes_slides(app, settings, slide_manager):
         where the dedicated channels are listed along with its color, name and bitness.
         By default all channels are returned.
 
+        * `composite` - Blend the selected channels into a single RGB image (e.g. for fluorescence images).
+        Every channel is tinted with a color (`channel_colors`, defaults to the channel colors of the slide info)
+        and windowed to an intensity range (`channel_min`, `channel_max`, defaults to the full 8-bit range or
+        the window given by the channel statistics of the slide). The parameters are given once per selected channel.
+
         * `z` - The region endpoint also offers the selection of a layer in a Z-Stack by setting the index z.
         Default is z=0.
 
@@ -294,7 +338,7 @@ def add_routes_slides(app, settings, slide_manager):
         that is used when image region contains whitespace when out of image extent. Default is white.
         Only works for 8-bit RGB slides, otherwise the background color is black.
 
-        * `image_format` - The image format can be selected. Formats include jpeg, png, tiff, bmp, gif.
+        * `image_format` - The image format can be selected. Formats include jpeg, png, tiff, bmp, gif, webp, jp2.
         When tiff is specified as output format the raw data of the image is returned.
         Multi-channel images can also be represented as RGB-images (mostly for displaying reasons in the viewer).
         Note that the mapping of all color channels to RGB values is currently restricted to the first three channels.
@@ -314,11 +358,84 @@ def add_routes_slides(app, settings, slide_manager):
             manager=slide_manager,
             plugin=plugin,
         )
+        # identical requests in flight share a single read and encode (after auth per caller)
+        request_key = make_region_cache_key(
+            slide_id,
+            plugin,
+            level,
+            start_x,
+            start_y,
+            size_x,
+            size_y,
+            z,
+            image_channels,
+            image_format,
+            image_quality,
+            vp_color,
+            make_composition_key(composite, channel_colors, channel_min, channel_max),
+        )
+        encoded_image = await slide_manager.image_requests.run(
+            request_key,
+            get_encoded_region,
+            slide_id,
+            plugin,
+            level,
+            start_x,
+            start_y,
+            size_x,
+            size_y,
+            image_channels,
+            (composite, channel_colors, channel_min, channel_max),
+            z,
+            vp_color,
+            image_format,
+            image_quality,
+        )
+        log_slide_access(slide_id)
+        return Response(encoded_image.data, media_type=encoded_image.media_type)
+
+    async def get_encoded_region(
+        slide_id,
+        plugin,
+        level,
+        start_x,
+        start_y,
+        size_x,
+        size_y,
+        image_channels,
+        composition_query,
+        z,
+        vp_color,
+        image_format,
+        image_quality,
+    ):
         slide = await slide_manager.get_slide(slide_id, plugin=plugin)
         slide_info = await slide.get_info()
         validate_image_level(slide_info, level)
         validate_image_z(slide_info, z)
         validate_image_channels(slide_info, image_channels)
+        if (
+            image_channels is None
+            and not composition_query[0]
+            and check_region_outside_image(
+                slide_info, level, start_x, start_y, size_x, size_y
+            )
+        ):
+            # regions outside of the image only consist of padding
+            return await get_encoded_padding_image(
+                slide_manager.padding_cache,
+                slide_manager.executor,
+                await slide.get_output_type(),
+                size_x,
+                size_y,
+                vp_color,
+                image_format,
+                image_quality,
+            )
+        channel_windows = await get_slide_channel_windows(slide_id, plugin, slide_info)
+        composition = get_channel_composition(
+            slide_info, image_channels, *composition_query, channel_windows
+        )
         if check_complete_region_overlap(
             slide_info, level, start_x, start_y, size_x, size_y
         ):
@@ -336,12 +453,18 @@ def add_routes_slides(app, settings, slide_manager):
                 size_y,
                 padding_color=vp_color,
                 z=z,
+                output_type=await slide.get_output_type(),
             )
-
-        log_slide_access(slide_id)
-        return make_response(
-            slide, image_region, image_format, image_quality, image_channels
+        response = make_response(
+            slide,
+            image_region,
+            image_format,
+            image_quality,
+            image_channels,
+            composition,
+            channel_windows,
         )
+        return EncodedImage(response.body, response.media_type)
 
     @app.get(
         "/slides/tile/level/{level}/tile/{tile_x}/{tile_y}",
@@ -359,6 +482,10 @@ def add_routes_slides(app, settings, slide_manager):
             examples=[0], description="Request the tile_y-th tile in y dimension"
         ),
         image_channels: List[int] = ImageChannelQuery,
+        composite: bool = ChannelCompositeQuery,
+        channel_colors: List[str] = ChannelColorsQuery,
+        channel_min: List[float] = ChannelMinQuery,
+        channel_max: List[float] = ChannelMaxQuery,
         z: int = ZStackQuery,
         padding_color: str = ImagePaddingColorQuery,
         image_format: str = ImageFormatsQuery,
@@ -387,6 +514,11 @@ def add_routes_slides(app, settings, slide_manager):
         where the dedicated channels are listed along with its color, name and bitness.
         By default all channels are returned.
 
+        * `composite` - Blend the selected channels into a single RGB image (e.g. for fluorescence images).
+        Every channel is tinted with a color (`channel_colors`, defaults to the channel colors of the slide info)
+        and windowed to an intensity range (`channel_min`, `channel_max`, defaults to the full 8-bit range or
+        the window given by the channel statistics of the slide). The parameters are given once per selected channel.
+
         * `z` - The region endpoint also offers the selection of a layer in a Z-Stack by setting the index z.
         Default is z=0.
 
@@ -394,7 +526,7 @@ def add_routes_slides(app, settings, slide_manager):
         that is used when image tile contains whitespace when out of image extent. Default is white.
         Only works for 8-bit RGB slides, otherwise the background color is black.
 
-        * `image_format` - The image format can be selected. Formats include jpeg, png, tiff, bmp, gif.
+        * `image_format` - The image format can be selected. Formats include jpeg, png, tiff, bmp, gif, webp, jp2.
         When tiff is specified as output format the raw data of the image is returned.
         Multi-channel images can also be represented as RGB-images (mostly for displaying reasons in the viewer).
         Note that the mapping of all color channels to RGB values is currently restricted to the first three channels.
@@ -413,11 +545,87 @@ def add_routes_slides(app, settings, slide_manager):
             manager=slide_manager,
             plugin=plugin,
         )
+        cache_key = make_tile_cache_key(
+            slide_id,
+            plugin,
+            level,
+            tile_x,
+            tile_y,
+            z,
+            image_channels,
+            image_format,
+            image_quality,
+            vp_color,
+            make_composition_key(composite, channel_colors, channel_min, channel_max),
+        )
+        slide_version = await slide_manager.get_slide_version(slide_id, plugin=plugin)
+        cached_response = await slide_manager.tile_cache.get_response(
+            cache_key, slide_version
+        )
+        if cached_response is not None:
+            log_slide_access(slide_id)
+            return cached_response
+        # identical requests in flight share a single read and encode (after auth per caller)
+        encoded_image = await slide_manager.image_requests.run(
+            ("tile",) + cache_key,
+            get_encoded_tile,
+            slide_id,
+            plugin,
+            level,
+            tile_x,
+            tile_y,
+            image_channels,
+            (composite, channel_colors, channel_min, channel_max),
+            z,
+            vp_color,
+            image_format,
+            image_quality,
+            cache_key,
+            slide_version,
+        )
+        log_slide_access(slide_id)
+        return Response(encoded_image.data, media_type=encoded_image.media_type)
+
+    async def get_encoded_tile(
+        slide_id,
+        plugin,
+        level,
+        tile_x,
+        tile_y,
+        image_channels,
+        composition_query,
+        z,
+        vp_color,
+        image_format,
+        image_quality,
+        cache_key,
+        slide_version,
+    ):
         slide = await slide_manager.get_slide(slide_id, plugin=plugin)
         slide_info = await slide.get_info()
         validate_image_level(slide_info, level)
         validate_image_z(slide_info, z)
         validate_image_channels(slide_info, image_channels)
+        if (
+            image_channels is None
+            and not composition_query[0]
+            and check_tile_outside_image(slide_info, level, tile_x, tile_y)
+        ):
+            # tiles outside of the image only consist of padding
+            return await get_encoded_padding_image(
+                slide_manager.padding_cache,
+                slide_manager.executor,
+                await slide.get_output_type(),
+                slide_info.tile_extent.x,
+                slide_info.tile_extent.y,
+                vp_color,
+                image_format,
+                image_quality,
+            )
+        channel_windows = await get_slide_channel_windows(slide_id, plugin, slide_info)
+        composition = get_channel_composition(
+            slide_info, image_channels, *composition_query, channel_windows
+        )
         if check_complete_tile_overlap(slide_info, level, tile_x, tile_y):
             image_tile = await slide.get_tile(
                 level, tile_x, tile_y, padding_color=vp_color, z=z
@@ -431,11 +639,72 @@ def add_routes_slides(app, settings, slide_manager):
                 tile_y,
                 padding_color=vp_color,
                 z=z,
+                output_type=await slide.get_output_type(),
             )
-        log_slide_access(slide_id)
-        return make_response(
-            slide, image_tile, image_format, image_quality, image_channels
+        output_type = None
+        if isinstance(image_tile, bytes) and image_channels is not None:
+            # encoded tiles are decoded like the regions of the slide to select channels
+            output_type = await slide.get_output_type()
+        response = make_response(
+            slide,
+            image_tile,
+            image_format,
+            image_quality,
+            image_channels,
+            composition,
+            channel_windows,
+            output_type,
+        )
+        encoded_image = EncodedImage(response.body, response.media_type)
+        slide_manager.tile_cache.put(cache_key, slide_version, encoded_image)
+        return encoded_image
+
+    async def get_slide_channel_windows(slide_id, plugin, slide_info):
+        # images with more than 8 bit per channel are windowed by slide wide statistics
+        if slide_info.channel_depth is None or slide_info.channel_depth <= 8:
+            return None
+        channel_statistics = await slide_manager.get_channel_statistics(
+            slide_id, plugin=plugin
         )
+        return get_channel_windows(channel_statistics)
+
+    async def safe_get_slide_channel_windows(slide_id, plugin, slide_info):
+        if slide_info is None:
+            return None
+        try:
+            return await get_slide_channel_windows(slide_id, plugin, slide_info)
+        except Exception:
+            return None  # tiles are windowed by their own intensities
+
+    @app.get(
+        "/slides/channel_statistics",
+        response_model=SlideChannelStatistics,
+        tags=["Main Routes"],
+    )
+    async def _(
+        slide_id=IdQuery,
+        plugin: str = PluginQuery,
+        payload: Optional[str] = Depends(get_authorization_header),
+    ):
+        """
+        Get intensity statistics (min, max, mean, histogram) of every channel of a slide given its ID.
+
+        The statistics are computed once per slide from a low resolution level. The display window
+        (`window_min`, `window_max`) of each channel is given by percentiles of its intensities and is used
+        to render tiles and regions of images with more than 8 bit per channel.
+        """
+        await api_integration.allow_access_slide(
+            calling_function="/slides/channel_statistics",
+            auth_payload=payload,
+            slide_id=slide_id,
+            manager=slide_manager,
+            plugin=plugin,
+        )
+        channel_statistics = await slide_manager.get_channel_statistics(
+            slide_id, plugin=plugin
+        )
+        log_slide_access(slide_id)
+        return channel_statistics
 
     @app.get("/slides/download", tags=["Main Routes"])
     async def _(
@@ -538,6 +807,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         """
         Get slide SET thumbnails image  given its ID. (see description above sister function)
@@ -556,15 +826,48 @@ def add_routes_slides(app, settings, slide_manager):
         await asyncio.gather(*requests)
 
         validate_image_request(image_format, image_quality)
+        cache_keys = [
+            make_thumbnail_cache_key(
+                sid, plugin, max_x, max_y, image_format, image_quality
+            )
+            for sid in slide_ids
+        ]
         requests = map(
-            lambda sid: safe_get_slide(slide_manager, sid, plugin=plugin), slide_ids
+            lambda sid: safe_get_slide_version(slide_manager, sid, plugin=plugin),
+            slide_ids,
         )
-        slides = await asyncio.gather(*requests)
+        slide_versions = await asyncio.gather(*requests)
+        # slides with a cached thumbnail are not opened
+        requests = map(
+            lambda i: slide_manager.tile_cache.get(cache_keys[i], slide_versions[i]),
+            range(len(slide_ids)),
+        )
+        cached_thumbnails = await asyncio.gather(*requests)
+        slides = [None] * len(slide_ids)
+        uncached = [i for i, cached in enumerate(cached_thumbnails) if cached is None]
+        requests = map(
+            lambda i: safe_get_slide(slide_manager, slide_ids[i], plugin=plugin),
+            uncached,
+        )
+        for i, slide in zip(uncached, await asyncio.gather(*requests)):
+            slides[i] = slide
 
-        requests = map(lambda slide: slide.get_thumbnail(max_x, max_y), slides)
-        thumbnails = await asyncio.gather(*requests)
         _ = [log_slide_access(slide) for slide in slide_ids]
-        return batch_safe_make_response(slides, thumbnails, image_format, image_quality)
+        thumbnails = [
+            batch_get_thumbnail(slides[i], max_x, max_y, cached_thumbnails[i])
+            for i in range(len(slide_ids))
+        ]
+        return batch_stream_response(
+            slides,
+            thumbnails,
+            image_format,
+            image_quality,
+            tile_cache=slide_manager.tile_cache,
+            cache_keys=cache_keys,
+            cache_versions=slide_versions,
+            entry_order=entry_order,
+            executor=slide_manager.executor,
+        )
 
     @app.get(
         "/files/label/max_size/{max_x}/{max_y}",
@@ -580,6 +883,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         """
         Get the label image of a slide set given path(s). (see description above sister function)
@@ -603,11 +907,16 @@ def add_routes_slides(app, settings, slide_manager):
         )
         slides = await asyncio.gather(*requests)
 
-        requests = map(lambda slide: slide.get_label(), slides)
-        labels = await asyncio.gather(*requests)
-        map(lambda l: l.thumbnail((max_x, max_y), Image.ANTIALIAS), labels)
         _ = [log_slide_access(slide) for slide in slide_ids]
-        return batch_safe_make_response(slides, labels, image_format, image_quality)
+        labels = [slide.get_label() for slide in slides]
+        return batch_stream_response(
+            slides,
+            labels,
+            image_format,
+            image_quality,
+            entry_order=entry_order,
+            executor=slide_manager.executor,
+        )
 
     @app.get(
         "/files/macro/max_size/{max_x}/{max_y}",
@@ -623,6 +932,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         """
         Get the macro image of a slide set given path(s). (see description above sister function)
@@ -646,11 +956,16 @@ def add_routes_slides(app, settings, slide_manager):
         )
         slides = await asyncio.gather(*requests)
 
-        requests = map(lambda slide: slide.get_macro(), slides)
-        macros = await asyncio.gather(*requests)
-        map(lambda m: m.thumbnail((max_x, max_y), Image.ANTIALIAS), macros)
         _ = [log_slide_access(slide) for slide in slide_ids]
-        return batch_safe_make_response(slides, macros, image_format, image_quality)
+        macros = [slide.get_macro() for slide in slides]
+        return batch_stream_response(
+            slides,
+            macros,
+            image_format,
+            image_quality,
+            entry_order=entry_order,
+            executor=slide_manager.executor,
+        )
 
     @app.get(
         "/files/tile/level/{level}/tile/{tile_x}/{tile_y}",
@@ -674,6 +989,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         """
         Get a tile of a slide given its path (see description above sister function)
@@ -701,8 +1017,31 @@ def add_routes_slides(app, settings, slide_manager):
 
         requests = map(safe_get_slide_info, slides)
         slide_infos = await asyncio.gather(*requests)
+        cache_keys = [
+            make_batch_tile_cache_key(
+                sid,
+                plugin,
+                level,
+                tile_x,
+                tile_y,
+                z,
+                image_channels,
+                image_format,
+                image_quality,
+                vp_color,
+            )
+            for sid in slide_ids
+        ]
+        requests = map(
+            lambda sid: safe_get_slide_version(slide_manager, sid, plugin=plugin),
+            slide_ids,
+        )
+        slide_versions = await asyncio.gather(*requests)
         requests = map(
-            lambda i: batch_safe_get_tile(
+            lambda i: batch_cached_get_tile(
+                slide_manager.tile_cache,
+                cache_keys[i],
+                slide_versions[i],
                 slides[i],
                 slide_infos[i],
                 level,
@@ -714,10 +1053,32 @@ def add_routes_slides(app, settings, slide_manager):
             ),
             range(slides.__len__()),
         )
-        regions = await asyncio.gather(*requests)
+        output_types = None
+        if image_channels is not None:
+            # encoded tiles are decoded like the regions of their slide to select channels
+            output_types = await asyncio.gather(*map(safe_get_output_type, slides))
+        slide_channel_windows = await asyncio.gather(
+            *[
+                safe_get_slide_channel_windows(slide_ids[i], plugin, slide_infos[i])
+                for i in range(len(slide_ids))
+            ]
+        )
         _ = [log_slide_access(slide) for slide in slide_ids]
-        return batch_safe_make_response(
-            slides, regions, image_format, image_quality, image_channels
+        # the tile coroutines are created last, so none is left unawaited if an await above fails
+        regions = list(requests)
+        return batch_stream_response(
+            slides,
+            regions,
+            image_format,
+            image_quality,
+            image_channels,
+            tile_cache=slide_manager.tile_cache,
+            cache_keys=cache_keys,
+            cache_versions=slide_versions,
+            entry_order=entry_order,
+            executor=slide_manager.executor,
+            output_types=output_types,
+            slide_channel_windows=slide_channel_windows,
         )
 
     # To allow for diverse regions etc..
@@ -739,6 +1100,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         """
         Get a tile of a slide given its path (see description above sister function)
@@ -769,8 +1131,31 @@ def add_routes_slides(app, settings, slide_manager):
         xs = [int(x) for x in xs.split(",")]
         ys = [int(x) for x in ys.split(",")]
         levels = [int(x) for x in levels.split(",")]
+        cache_keys = [
+            make_batch_tile_cache_key(
+                slide_ids[i],
+                plugin,
+                levels[i],
+                xs[i],
+                ys[i],
+                z,
+                image_channels,
+                image_format,
+                image_quality,
+                vp_color,
+            )
+            for i in range(len(slide_ids))
+        ]
+        requests = map(
+            lambda sid: safe_get_slide_version(slide_manager, sid, plugin=plugin),
+            slide_ids,
+        )
+        slide_versions = await asyncio.gather(*requests)
         requests = map(
-            lambda i: batch_safe_get_tile(
+            lambda i: batch_cached_get_tile(
+                slide_manager.tile_cache,
+                cache_keys[i],
+                slide_versions[i],
                 slides[i],
                 slide_infos[i],
                 levels[i],
@@ -782,10 +1167,30 @@ def add_routes_slides(app, settings, slide_manager):
             ),
             range(slides.__len__()),
         )
-
-        regions = await asyncio.gather(*requests)
-        return batch_safe_make_response(
-            slides, regions, image_format, image_quality, image_channels
+        output_types = None
+        if image_channels is not None:
+            # encoded tiles are decoded like the regions of their slide to select channels
+            output_types = await asyncio.gather(*map(safe_get_output_type, slides))
+        slide_channel_windows = await asyncio.gather(
+            *[
+                safe_get_slide_channel_windows(slide_ids[i], plugin, slide_infos[i])
+                for i in range(len(slide_ids))
+            ]
+        )
+        regions = list(requests)
+        return batch_stream_response(
+            slides,
+            regions,
+            image_format,
+            image_quality,
+            image_channels,
+            tile_cache=slide_manager.tile_cache,
+            cache_keys=cache_keys,
+            cache_versions=slide_versions,
+            entry_order=entry_order,
+            executor=slide_manager.executor,
+            output_types=output_types,
+            slide_channel_windows=slide_channel_windows,
         )
 
     #############################################
@@ -825,9 +1230,17 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         return await thumbnail(
-            slides, max_x, max_y, image_format, image_quality, plugin, payload
+            slides,
+            max_x,
+            max_y,
+            image_format,
+            image_quality,
+            plugin,
+            payload,
+            entry_order,
         )
 
     @app.get(
@@ -844,9 +1257,17 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         return await label(
-            slides, max_x, max_y, image_format, image_quality, plugin, payload
+            slides,
+            max_x,
+            max_y,
+            image_format,
+            image_quality,
+            plugin,
+            payload,
+            entry_order,
         )
 
     @app.get(
@@ -863,9 +1284,17 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         return await macro(
-            slides, max_x, max_y, image_format, image_quality, plugin, payload
+            slides,
+            max_x,
+            max_y,
+            image_format,
+            image_quality,
+            plugin,
+            payload,
+            entry_order,
         )
 
     @app.get(
@@ -890,6 +1319,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         return await tile(
             slides,
@@ -903,6 +1333,7 @@ def add_routes_slides(app, settings, slide_manager):
             image_quality,
             plugin,
             payload,
+            entry_order,
         )
 
     @app.get(
@@ -923,6 +1354,7 @@ def add_routes_slides(app, settings, slide_manager):
         image_quality: int = ImageQualityQuery,
         plugin: str = PluginQuery,
         payload: Optional[str] = Depends(get_authorization_header),
+        entry_order: str = BatchEntryOrderQuery,
     ):
         return await batch(
             slides,
@@ -936,4 +1368,5 @@ def add_routes_slides(app, settings, slide_manager):
             image_quality,
             plugin,
             payload,
+            entry_order,
         )
@@ -0,0 +1,19 @@
+from typing import Dict
+
+from fastapi import status
+
+from wsi_service.custom_models.service_status import CacheStatus
+
+
+def add_routes_status(app, settings, slide_manager):
+    @app.get(
+        "/status/caches",
+        tags=["Server"],
+        response_model=Dict[str, CacheStatus],
+        status_code=status.HTTP_200_OK,
+    )
+    async def _():
+        """
+        Get occupancy and hit/miss counters of the caches of this worker
+        """
+        return slide_manager.get_cache_status()
@@ -1,3 +1,4 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Response, Query, Request
@@ -48,8 +49,23 @@ slide_manager = SlideManager(
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    background_tasks = []
+    if (
+        slide_manager.slide_info_index is not None
+        and slide_manager.local_mapper is not None
+        and settings.slide_info_index_warm_up
+    ):
+        background_tasks.append(asyncio.create_task(slide_manager.index_local_slides()))
+    if settings.warm_up_slides_file:
+        background_tasks.append(
+            asyncio.create_task(slide_manager.warm_up(settings.warm_up_slides_file))
+        )
     yield
-    slide_manager.close()
+    for task in background_tasks:
+        task.cancel()
+    if settings.warm_up_slides_file:
+        slide_manager.write_recent_slides(settings.warm_up_slides_file)
+    await slide_manager.close()
 
 
 docsUrl = "/docs" if not settings.prod_mode else None
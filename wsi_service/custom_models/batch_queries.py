@@ -1,6 +1,5 @@
 from fastapi import Query
 
-
 IdListQuery = Query(
     ...,
     example="b10648a7-340d-43fc-a2d9-4d91cc86f33f,b10648a7-340d-43fc-a2d9-4d91cc86f33f",
@@ -22,6 +21,13 @@ TileLevelListQuery = Query(
     example="0,5,1,2",
     description="""Provide level list to access tiles at. The size must match the number of files requested.""",
 )
+BatchEntryOrderQuery = Query(
+    "request",
+    pattern="^(request|completion)$",
+    description="""Order of the entries in the returned zip archive. With 'request' entries follow the order
+    of the requested items, with 'completion' every entry is sent as soon as it is ready and an additional
+    index.json lists the entry names together with the index of the requested item.""",
+)
 ## Legacy model for old batch endpoints:
 SlideListQuery = Query(
     ...,
@@ -0,0 +1,23 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class ChannelStatistics(BaseModel):
+    id: int = Field(description="Channel ID")
+    min: float = Field(description="Minimum intensity of the channel")
+    max: float = Field(description="Maximum intensity of the channel")
+    mean: float = Field(description="Mean intensity of the channel")
+    window_min: float = Field(
+        description="Lower percentile of the intensities, used as lower bound of the display window"
+    )
+    window_max: float = Field(
+        description="Upper percentile of the intensities, used as upper bound of the display window"
+    )
+    histogram: List[int] = Field(description="Pixel counts of equally sized intensity bins between min and max")
+
+
+class SlideChannelStatistics(BaseModel):
+    level: int = Field(description="Pyramid level the statistics are computed from")
+    percentiles: List[float] = Field(description="Percentiles of the intensities that define the display windows")
+    channels: List[ChannelStatistics]
@@ -1,6 +1,5 @@
 from fastapi import Query
 
-
 IdQuery = Query(
     ...,
     example="b10648a7-340d-43fc-a2d9-4d91cc86f33f",
@@ -9,7 +8,7 @@ IdQuery = Query(
 
 ImageFormatsQuery = Query(
     "jpeg",
-    description="Image format (e.g. bmp, gif, jpeg, png, tiff). For raw image data choose tiff.",
+    description="Image format (e.g. bmp, gif, jpeg, png, tiff, webp, jp2). For raw image data choose tiff.",
 )
 
 ImageQualityQuery = Query(
@@ -26,6 +25,32 @@ ImageChannelQuery = Query(
     description="List of requested image channels. By default all channels are returned.",
 )
 
+ChannelCompositeQuery = Query(
+    False,
+    description="""Blend the selected channels (image_channels, by default all channels) into a single RGB image.
+    Every channel is tinted with its color and windowed to its intensity range (see channel_colors,
+    channel_min and channel_max).""",
+)
+
+ChannelColorsQuery = Query(
+    None,
+    examples=[["#FF0000", "#00FF00"]],
+    description="""Color per selected channel as 24bit-hex-string with leading # (only with composite=true).
+    Defaults to the channel colors of the slide info.""",
+)
+
+ChannelMinQuery = Query(
+    None,
+    description="""Lower bound of the intensity window per selected channel (only with composite=true).
+    Defaults to 0 for 8-bit channels and to the minimum of the channel in the image otherwise.""",
+)
+
+ChannelMaxQuery = Query(
+    None,
+    description="""Upper bound of the intensity window per selected channel (only with composite=true).
+    Defaults to 255 for 8-bit channels and to the maximum of the channel in the image otherwise.""",
+)
+
 ImagePaddingColorQuery = Query(
     None,
     examples=["#FFFFFF"],
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -13,3 +13,15 @@ class PluginInfo(BaseModel):
 
 class WSIServiceStatus(ServiceStatus):
     plugins: List[PluginInfo]
+
+
+class CacheStatus(BaseModel):
+    entries: int
+    hits: int = 0
+    negative_hits: Optional[int] = None
+    misses: int = 0
+    size_bytes: Optional[int] = None
+    max_size_bytes: Optional[int] = None
+    max_entries: Optional[int] = None
+    file_descriptors: Optional[int] = None
+    max_file_descriptors: Optional[int] = None
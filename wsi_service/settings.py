@@ -1,4 +1,4 @@
-from typing import Set
+from typing import Dict, Set
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -31,10 +31,50 @@ class Settings(BaseSettings):
     enable_viewer_routes: bool = True
     inactive_histo_image_timeout_seconds: int = 600
     image_handle_cache_size: int = 50
+    # budgets of the summed estimated memory and file descriptors of open slides, 0 is unlimited
+    image_handle_cache_max_memory_bytes: int = 0
+    image_handle_cache_max_file_descriptors: int = 0
+    # maximum number of handles of a slide that are read concurrently (for plugins that
+    # serialize reads on a handle)
+    image_handle_pool_size: int = 4
     max_returned_region_size: int = 25_000_000  # e.g. 5000 x 5000
     max_thumbnail_size: int = 500
     root_path: str = ""
 
+    # Slide Access Settings:
+    # storage mapper responses are cached per slide id, unknown slide ids for a shorter time
+    mapper_cache_size: int = 10_000
+    mapper_cache_ttl_seconds: int = 300
+    mapper_cache_negative_ttl_seconds: int = 30
+    # blocking plugin calls (open, read, decode) run in bounded thread pools, one per plugin
+    plugin_executor_enabled: bool = True
+    plugin_executor_workers: int = 8
+    plugin_executor_workers_per_plugin: Dict[str, int] = {}  # e.g. {"openslide": 16}
+    # byte budget of decoded native tiles shared by all slides of a worker (openslide,
+    # tiffslide, tifffile), overlapping region requests do not decode tiles again
+    decoded_tile_cache_size_bytes: int = 268_435_456
+    # memory budget of the operation cache of libvips (vips plugin), 0 disables the cache
+    vips_cache_max_memory_bytes: int = 104_857_600
+    # byte budget of the encoded tile cache of each worker, 0 disables the cache
+    tile_cache_size_bytes: int = 134_217_728
+    # byte budget of the encoded padding images (tiles and regions outside of the image) of each worker
+    padding_cache_size_bytes: int = 16_777_216
+    # directory of the encoded tile cache on disk that is shared by all workers, empty disables it
+    tile_cache_dir: str = ""
+    tile_cache_dir_size_bytes: int = 4_294_967_296
+    # directory of a persistent index of slide infos that answers info requests without
+    # opening slides, empty disables it
+    slide_info_index_dir: str = ""
+    slide_info_index_size_bytes: int = 268_435_456
+    # index all slides of the local mapper in the background after startup
+    slide_info_index_warm_up: bool = True
+    # recently accessed slides are written to this file on shutdown and opened again in the
+    # background after the next startup (info and thumbnail included), empty disables it
+    warm_up_slides_file: str = ""
+    # channel statistics (display windows of high bit depth images) are computed from the
+    # highest resolution level with at most this many pixels
+    channel_statistics_max_pixels: int = 4_000_000
+
     # Cognito Specific Settings:
     cognito_user_pool_id: str = ""
     aws_region: str = ""
@@ -1,3 +1,13 @@
+import asyncio
+import functools
+from collections import namedtuple
+
+from wsi_service.utils.image_utils import get_image_output_type
+
+# estimated resources held by an open slide
+HandleCost = namedtuple("HandleCost", ["memory_bytes", "file_descriptors"])
+
+
 class Slide(object):
     @classmethod
     async def create(cls, filepath):
@@ -36,3 +46,135 @@ class Slide(object):
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0):
         # allowed to return pil image or numpy array or bytes object
         raise NotImplementedError
+
+    # plugins that serialize reads on a handle can open several handles of a slide
+    # that are read concurrently (see PooledExecutorSlide)
+    supports_handle_pool = False
+    output_type = None
+
+    async def get_output_type(self):
+        # type, channels and dtype of the returned images, determined with a single read
+        # per slide, so padding outside of the image does not need reads
+        if self.output_type is None:
+            self.output_type = get_image_output_type(
+                await self.get_region(0, 0, 0, 1, 1)
+            )
+        return self.output_type
+
+    def get_handle_cost(self):
+        # estimated memory and file descriptors held while the slide is open,
+        # must be cheap as it is called on every access
+        return HandleCost(get_cached_images_size(self), 1)
+
+
+def get_cached_images_size(slide):
+    # associated images kept by plugins after their first request
+    size = 0
+    for name in ["thumbnail", "label", "macro"]:
+        image = getattr(slide, name, None)
+        if hasattr(image, "getbands"):
+            size += image.width * image.height * len(image.getbands())
+        elif hasattr(image, "nbytes"):
+            size += image.nbytes
+    return size
+
+
+class ExecutorSlide:
+    """
+    Wraps an opened plugin slide and runs its blocking calls in the plugin's executor pool,
+    all other attributes are passed through to the wrapped slide.
+    """
+
+    offloaded_methods = [
+        "get_region",
+        "get_tile",
+        "get_thumbnail",
+        "get_label",
+        "get_macro",
+        "refresh",
+        "close",
+    ]
+
+    def __init__(self, slide, executor):
+        self.slide = slide
+        self.executor = executor
+
+    async def get_output_type(self):
+        # only the first call reads from the slide (through the executor, pooled if
+        # several handles are open)
+        if self.slide.output_type is None:
+            self.slide.output_type = get_image_output_type(
+                await self.get_region(0, 0, 0, 1, 1)
+            )
+        return self.slide.output_type
+
+    def __getattr__(self, name):
+        if name == "slide":
+            raise AttributeError(name)
+        attribute = getattr(self.slide, name)
+        if name in self.offloaded_methods:
+            return functools.partial(
+                self.executor.run_coroutine, self.slide.plugin, attribute
+            )
+        return attribute
+
+
+class PooledExecutorSlide(ExecutorSlide):
+    """
+    ExecutorSlide that spreads region and tile reads over up to max_handles independently
+    opened handles of the same slide. Additional handles are opened with open_handle (a coroutine
+    function) while all handles are busy. All other calls use the first handle. Handles that are
+    busy while the slide is closed are closed once their read has finished.
+    """
+
+    pooled_methods = ["get_region", "get_tile"]
+
+    def __init__(self, slide, executor, open_handle, max_handles):
+        super().__init__(slide, executor)
+        self.open_handle = open_handle
+        self.handles = [slide]
+        self.idle_handles = [slide]
+        self.handle_slots = asyncio.Semaphore(max_handles)
+        self.closed = False
+
+    def __getattr__(self, name):
+        if name in self.pooled_methods:
+            return functools.partial(self._run_pooled, name)
+        return super().__getattr__(name)
+
+    async def close(self):
+        self.closed = True
+        idle_handles, self.idle_handles = self.idle_handles, []
+        self.handles = [handle for handle in self.handles if handle not in idle_handles]
+        await asyncio.gather(*[self._close_handle(handle) for handle in idle_handles])
+
+    def get_handle_cost(self):
+        costs = [handle.get_handle_cost() for handle in self.handles]
+        return HandleCost(
+            sum(cost.memory_bytes for cost in costs),
+            sum(cost.file_descriptors for cost in costs),
+        )
+
+    async def _run_pooled(self, name, *args, **kwargs):
+        async with self.handle_slots:
+            if self.idle_handles:
+                handle = self.idle_handles.pop()
+            else:
+                handle = await self.open_handle()
+                if self.closed:
+                    await self._close_handle(handle)
+                    raise RuntimeError("Slide was closed while opening an additional handle")
+                self.handles.append(handle)
+            try:
+                return await self.executor.run_coroutine(
+                    handle.plugin, getattr(handle, name), *args, **kwargs
+                )
+            finally:
+                if self.closed:
+                    self.handles.remove(handle)
+                    await self._close_handle(handle)
+                else:
+                    self.idle_handles.append(handle)
+
+    async def _close_handle(self, handle):
+        await self.executor.run_coroutine(handle.plugin, handle.close)
@@ -1,26 +1,97 @@
 import asyncio
+import fcntl
+import functools
+import json
 import os
 import pathlib
+import time
+from collections import OrderedDict
 
 import aiohttp
 from fastapi import HTTPException
 
 from wsi_service.models.v3.slide import SlideInfo as SlideInfoV3
 from wsi_service.plugins import load_slide
-from wsi_service.singletons import logger
-from wsi_service.utils.slide_utils import ExpiringSlide, LRUCache
+from wsi_service.singletons import http_client, logger, settings
+from wsi_service.slide import ExecutorSlide, PooledExecutorSlide
+from wsi_service.utils.async_utils import SingleFlight
+from wsi_service.utils.cache_utils import (
+    ByteLRUCache,
+    DiskCache,
+    SlideInfoIndex,
+    TileCache,
+    TTLCache,
+    get_file_version,
+)
+from wsi_service.utils.executor_utils import PluginExecutor
+from wsi_service.utils.slide_utils import ExpiringSlide, SlideHandleCache
+from wsi_service.utils.statistics_utils import (
+    compute_channel_statistics,
+    get_statistics_level,
+)
+from wsi_service.utils.tiff_utils import decoded_tile_cache
 
 
 class SlideManager:
+    # number of slides opened at the same time while indexing slide infos
+    index_concurrency = 2
+    # the warm-up only opens the next slide once live requests paused for this long
+    warm_up_idle_seconds = 0.5
+    # upper bound of the interval in which idle slides are closed
+    max_sweep_interval_seconds = 10
+
     def __init__(self, mapper_address, data_dir, timeout, cache_size):
         self.mapper_address = mapper_address
         self.data_dir = data_dir
         self.timeout = timeout
-        self.slide_cache = LRUCache(cache_size)
-        self.lock = asyncio.Lock()
-        self.storage_locks = {}
-        self.event_loop = asyncio.get_event_loop()
+        self.slide_cache = SlideHandleCache(
+            cache_size,
+            max_memory_bytes=settings.image_handle_cache_max_memory_bytes,
+            max_file_descriptors=settings.image_handle_cache_max_file_descriptors,
+        )
+        self.slide_openings = SingleFlight()
+        self.storage_address_lookups = SingleFlight()
+        # identical image requests in flight, shared by the api routes
+        self.image_requests = SingleFlight()
+        self.statistics_computations = SingleFlight()
+        self.storage_address_cache = TTLCache(
+            settings.mapper_cache_size,
+            settings.mapper_cache_ttl_seconds,
+            negative_ttl_seconds=settings.mapper_cache_negative_ttl_seconds,
+        )
+        # most recently accessed (slide_id, plugin) with their access time (epoch seconds),
+        # kept for the warm-up after a restart
+        self.recent_slides = OrderedDict()
+        self.last_access_time = 0
+        self.expiration_sweeper = None
+        # closes of evicted slides that run in the background
+        self.closing_tasks = set()
         self.local_mapper = None
+        self.executor = PluginExecutor(
+            settings.plugin_executor_workers,
+            workers_per_plugin=settings.plugin_executor_workers_per_plugin,
+            enabled=settings.plugin_executor_enabled,
+        )
+        disk_cache = None
+        if settings.tile_cache_dir:
+            disk_cache = DiskCache(
+                os.path.join(settings.tile_cache_dir, "tiles.sqlite"),
+                settings.tile_cache_dir_size_bytes,
+            )
+        self.tile_cache = TileCache(
+            settings.tile_cache_size_bytes,
+            disk_cache=disk_cache,
+            executor=self.executor,
+        )
+        # encoded images of tiles and regions outside of the image, shared by all slides
+        self.padding_cache = ByteLRUCache(settings.padding_cache_size_bytes, get_size=lambda image: len(image.data))
+        self.slide_info_index = None
+        if settings.slide_info_index_dir:
+            self.slide_info_index = SlideInfoIndex(
+                os.path.join(settings.slide_info_index_dir, "slide_info.sqlite"),
+                settings.slide_info_index_size_bytes,
+                self.executor,
+            )
 
     def with_local_mapper(self, local_mapper):
         self.local_mapper = local_mapper
@@ -28,31 +99,23 @@ class SlideManager:
 
     async def get_slide(self, slide_id, plugin=None):
         cache_id = slide_id + f" ({plugin})" if plugin else slide_id
-
-        async with self.lock:
-            if cache_id not in self.storage_locks:
-                self.storage_locks[cache_id] = asyncio.Lock()
+        self._record_slide_access(slide_id, plugin)
 
         exp_slide = self.slide_cache.get_item(cache_id)
         if exp_slide is None:
-            main_storage_address = await self._get_slide_main_storage_address(slide_id)
-            storage_address = os.path.join(
-                self.data_dir, main_storage_address["address"]
+            # concurrent requests for a slide that is not open yet share a single open call
+            exp_slide = await self.slide_openings.run(
+                cache_id, self._open_slide, slide_id, cache_id, plugin
             )
-            logger.debug("Storage address for slide %s: %s", slide_id, storage_address)
-
-            async with self.storage_locks[cache_id]:
-                slide = await load_slide(storage_address, plugin=plugin)
-                exp_slide = ExpiringSlide(slide)
-                removed_item = self.slide_cache.put_item(cache_id, exp_slide)
-                if removed_item:
-                    removed_item[1].timer.cancel()
-                    await removed_item[1].slide.close()
-                logger.debug(
-                    "New slide handle opened for storage address: %s", storage_address
-                )
 
         self._reset_slide_expiration(cache_id, exp_slide)
+        # costs grow with cached data (e.g. thumbnails), other slides may have to be closed
+        self.slide_cache.update_cost(cache_id, exp_slide.slide.get_handle_cost())
+        removed_items = self.slide_cache.evict()
+        if removed_items:
+            task = asyncio.create_task(self._close_removed_slides(removed_items))
+            self.closing_tasks.add(task)
+            task.add_done_callback(self.closing_tasks.discard)
 
         try:  # check if slide is up-to-date and update if supported
             await exp_slide.slide.refresh()
@@ -62,44 +125,324 @@ class SlideManager:
         return exp_slide.slide
 
     async def get_slide_info(self, slide_id, slide_info_model, plugin=None):
+        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
+        if self.slide_info_index is not None and not self.slide_cache.has_item(
+            cache_id
+        ):
+            # answer from the index without opening a slide handle
+            storage_path = await self._get_slide_storage_path(slide_id)
+            slide_info_json = await self.slide_info_index.get(storage_path, plugin)
+            if slide_info_json is not None:
+                slide_info = SlideInfoV3.model_validate_json(slide_info_json)
+                slide_info.id = slide_id
+                logger.debug("successfully returning indexed slide info")
+                return self._convert_slide_info_to_match_slide_info_model(
+                    slide_info, slide_info_model
+                )
+        # opening a slide adds its info to the index
         slide = await self.get_slide(slide_id=slide_id, plugin=plugin)
-        slide_info = await slide.get_info()
-        # overwrite dummy id with actual slide id
-        slide_info.id = slide_id
+        slide_info = await self._get_complete_slide_info(slide, slide_id)
         # slide info conversion
         slide_info = self._convert_slide_info_to_match_slide_info_model(
             slide_info, slide_info_model
         )
+        logger.debug("successfully returning from get_slide_info")
+        return slide_info
+
+    async def index_slides(self, slide_ids, plugin=None):
+        """
+        Adds the infos of all given slides that are missing in the slide info index.
+        Slides are opened with a few concurrent calls and closed again right away.
+        """
+        semaphore = asyncio.Semaphore(self.index_concurrency)
+
+        async def index_slide(slide_id):
+            async with semaphore:
+                try:
+                    await self._index_slide(slide_id, plugin)
+                except Exception as e:
+                    logger.debug("Failed to index slide %s: %s", slide_id, e)
+
+        await asyncio.gather(*[index_slide(slide_id) for slide_id in slide_ids])
+
+    async def index_local_slides(self):
+        def get_local_slide_ids():
+            return [
+                slide_id
+                for case in self.local_mapper.get_cases()
+                for slide_id in case.slides
+            ]
+
+        try:
+            slide_ids = await self.executor.run("open", get_local_slide_ids)
+        except Exception as e:
+            logger.warning("Failed to list local slides for indexing: %s", e)
+            return
+        logger.info("Indexing slide infos of %s local slides", len(slide_ids))
+        await self.index_slides(slide_ids)
+        logger.info("Indexed slide infos of local slides")
+
+    async def get_channel_statistics(self, slide_id, plugin=None):
+        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
+        slide = await self.get_slide(slide_id, plugin=plugin)
+        exp_slide = self.slide_cache.get_item(cache_id)
+        if exp_slide is not None and exp_slide.channel_statistics is not None:
+            return exp_slide.channel_statistics
+        channel_statistics = await self.statistics_computations.run(
+            cache_id, self._load_channel_statistics, slide, cache_id
+        )
+        if exp_slide is not None:
+            # kept with the slide handle, computed again only after it was closed
+            exp_slide.channel_statistics = channel_statistics
+        return channel_statistics
+
+    async def get_slide_version(self, slide_id, plugin=None):
+        """
+        Returns the version of the slide file (see get_file_version) or None if it cannot be
+        determined (e.g. the file is missing). Images of slides without a version are not cached,
+        errors are raised when the slide is opened.
+        """
+        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
+        exp_slide = self.slide_cache.get_item(cache_id)
+        if exp_slide is not None:
+            filepath = exp_slide.slide.filepath
+        else:
+            filepath = await self._get_slide_storage_path(slide_id)
+        try:
+            # stat can block on network storage
+            return await self.executor.run("stat", get_file_version, filepath)
+        except OSError as e:
+            logger.debug("Failed to determine version of slide %s: %s", slide_id, e)
+            return None
+
+    async def get_slide_file_paths(self, slide_id):
+        storage_addresses = await self._get_slide_storage_addresses(slide_id)
+        return [os.path.join(self.data_dir, s["address"]) for s in storage_addresses]
+
+    async def warm_up(self, slides_file):
+        """
+        Opens the slides listed in slides_file (written on the last shutdown) and prepares
+        their info and thumbnail. Slides are opened one by one and only while live requests pause.
+        """
+        recent_slides = self._read_recent_slides(slides_file)[: self.slide_cache.maxSize]
+        if not recent_slides:
+            return
+        logger.info("Warming up %s recently accessed slides", len(recent_slides))
+        for slide_id, plugin, _ in recent_slides:
+            while time.monotonic() - self.last_access_time < self.warm_up_idle_seconds:
+                await asyncio.sleep(self.warm_up_idle_seconds)
+            try:
+                await self._warm_up_slide(slide_id, plugin)
+            except Exception as e:
+                logger.debug("Failed to warm up slide %s: %s", slide_id, e)
+        logger.info("Finished warm-up of recently accessed slides")
+
+    def write_recent_slides(self, slides_file):
+        """
+        Merges the recently accessed slides of this worker into slides_file, most recent first.
+        Workers shut down at once, so the file is read, merged and replaced under a file lock.
+        """
+        temp_file = f"{slides_file}.{os.getpid()}.tmp"
+        try:
+            with open(f"{slides_file}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                access_times = dict(reversed(self.recent_slides.items()))
+                for slide_id, plugin, accessed_at in self._read_recent_slides(slides_file):
+                    key = (slide_id, plugin)
+                    access_times[key] = max(accessed_at, access_times.get(key, 0))
+                recent_slides = sorted(
+                    ([slide_id, plugin, accessed_at] for (slide_id, plugin), accessed_at in access_times.items()),
+                    key=lambda item: item[2],
+                    reverse=True,
+                )
+                with open(temp_file, "w") as f:
+                    json.dump(recent_slides[: self.slide_cache.maxSize], f)
+                os.replace(temp_file, slides_file)
+        except OSError as e:
+            logger.warning("Failed to write recently accessed slides: %s", e)
+
+    async def close(self):
+        if self.expiration_sweeper is not None:
+            self.expiration_sweeper.cancel()
+            self.expiration_sweeper = None
+        # slides are closed in the executor pools, which are shut down afterwards
+        cache_ids = list(self.slide_cache.get_all())
+        if cache_ids:
+            await self._close_slides(cache_ids)
+        if self.closing_tasks:
+            await asyncio.gather(*self.closing_tasks)
+        self.executor.shutdown()
+
+    def get_cache_status(self):
+        status = self.tile_cache.get_status()
+        status["slides"] = self.slide_cache.get_status()
+        status["storage_addresses"] = self.storage_address_cache.get_status()
+        status["decoded_tiles"] = decoded_tile_cache.get_status()
+        status["padding"] = self.padding_cache.get_status()
+        if self.slide_info_index is not None:
+            status["slide_info_index"] = self.slide_info_index.get_status()
+        return status
+
+    async def _open_slide(self, slide_id, cache_id, plugin):
+        exp_slide = self.slide_cache.get_item(cache_id)
+        if exp_slide is not None:
+            return exp_slide
+        storage_address = await self._get_slide_storage_path(slide_id)
+        logger.debug("Storage address for slide %s: %s", slide_id, storage_address)
+        slide = await self.executor.run_coroutine(
+            "open", load_slide, storage_address, plugin=plugin
+        )
+        if slide.supports_handle_pool and settings.image_handle_pool_size > 1:
+            # concurrent reads of a hot slide use independent handles
+            open_handle = functools.partial(
+                self.executor.run_coroutine,
+                "open",
+                load_slide,
+                storage_address,
+                plugin=slide.plugin,
+            )
+            executor_slide = PooledExecutorSlide(
+                slide, self.executor, open_handle, settings.image_handle_pool_size
+            )
+        else:
+            executor_slide = ExecutorSlide(slide, self.executor)
+        exp_slide = ExpiringSlide(executor_slide)
+        if self.slide_info_index is not None:
+            await self._put_indexed_slide_info(slide, slide_id, storage_address, plugin)
+        removed_items = self.slide_cache.put_item(
+            cache_id, exp_slide, slide.get_handle_cost()
+        )
+        await self._close_removed_slides(removed_items)
+        logger.debug("New slide handle opened for storage address: %s", storage_address)
+        return exp_slide
+
+    async def _close_removed_slides(self, removed_items):
+        # closing runs in the executor pools of the plugins
+        results = await asyncio.gather(
+            *[exp_slide.slide.close() for _, exp_slide in removed_items],
+            return_exceptions=True,
+        )
+        for (cache_id, _), result in zip(removed_items, results):
+            if isinstance(result, Exception):
+                logger.warning("Failed to close slide %s: %s", cache_id, result)
+            else:
+                logger.debug("Closed slide with storage address: %s", cache_id)
+
+    async def _load_channel_statistics(self, slide, cache_id):
+        disk_cache = self.tile_cache.disk_cache
+        key = repr(("channel_statistics", cache_id))
+        version = get_file_version(slide.filepath)
+        if disk_cache is not None:
+            entry = await self.executor.run("disk_cache", disk_cache.get, key, version)
+            if entry is not None:
+                return json.loads(entry[1])
+        slide_info = await slide.get_info()
+        level = get_statistics_level(slide_info, settings.channel_statistics_max_pixels)
+        extent = slide_info.levels[level].extent
+        image_region = await slide.get_region(level, 0, 0, extent.x, extent.y)
+        channel_statistics = await self.executor.run(
+            "encode", compute_channel_statistics, image_region, level
+        )
+        logger.debug("Computed channel statistics of %s on level %s", cache_id, level)
+        if disk_cache is not None:
+            self.executor.submit(
+                "disk_cache",
+                disk_cache.put,
+                key,
+                version,
+                json.dumps(channel_statistics).encode(),
+                "application/json",
+            )
+        return channel_statistics
+
+    async def _index_slide(self, slide_id, plugin):
+        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
+        storage_path = await self._get_slide_storage_path(slide_id)
+        if self.slide_cache.has_item(cache_id):
+            return
+        if await self.slide_info_index.get(storage_path, plugin) is not None:
+            return
+        # not added to the slide cache to keep the handles of active slides open
+        slide = await self.executor.run_coroutine(
+            "open", load_slide, storage_path, plugin=plugin
+        )
+        try:
+            await self._put_indexed_slide_info(slide, slide_id, storage_path, plugin)
+        finally:
+            await self.executor.run_coroutine(slide.plugin, slide.close)
+
+    async def _put_indexed_slide_info(self, slide, slide_id, storage_path, plugin):
+        slide_info = await self._get_complete_slide_info(slide, slide_id)
+        if isinstance(slide_info, SlideInfoV3):
+            self.slide_info_index.put(
+                storage_path, plugin, slide_info.model_dump_json()
+            )
+
+    async def _get_complete_slide_info(self, slide, slide_id):
+        slide_info = await slide.get_info()
+        # overwrite dummy id with actual slide id
+        slide_info.id = slide_id
         if isinstance(slide_info, SlideInfoV3):
             self._extend_slide_format_identifier(slide, slide_info)
             # enable raw download if filepath exists on disk
             if os.path.exists(slide.filepath):
                 slide_info.raw_download = True
-        logger.debug("successfully returning from get_slide_info")
         return slide_info
 
-    async def get_slide_file_paths(self, slide_id):
-        storage_addresses = await self._get_slide_storage_addresses(slide_id)
-        return [os.path.join(self.data_dir, s["address"]) for s in storage_addresses]
+    async def _warm_up_slide(self, slide_id, plugin):
+        cache_id = slide_id + f" ({plugin})" if plugin else slide_id
+        # bypasses get_slide, the warm-up is not a live access
+        exp_slide = self.slide_cache.get_item(cache_id)
+        if exp_slide is None:
+            exp_slide = await self.slide_openings.run(
+                cache_id, self._open_slide, slide_id, cache_id, plugin
+            )
+        self._reset_slide_expiration(cache_id, exp_slide)
+        slide = exp_slide.slide
+        await self._get_complete_slide_info(slide, slide_id)
+        # plugins keep the thumbnail of the default size
+        await slide.get_thumbnail(
+            settings.max_thumbnail_size, settings.max_thumbnail_size
+        )
 
-    def close(self):
-        for cache_id, slide in self.slide_cache.get_all().items():
-            slide.timer.cancel()
-            self._sync_close_slide(cache_id)
+    def _read_recent_slides(self, slides_file):
+        # [slide_id, plugin, accessed_at] items, most recent first
+        try:
+            with open(slides_file) as f:
+                return [[slide_id, plugin, accessed_at] for slide_id, plugin, accessed_at in json.load(f)]
+        except (OSError, TypeError, ValueError):
+            return []
 
-    async def _set_storage_lock(self, cache_id):
-        async with self.lock:
-            if cache_id not in self.storage_locks:
-                self.storage_locks[cache_id] = asyncio.Lock()
+    def _record_slide_access(self, slide_id, plugin):
+        self.last_access_time = time.monotonic()
+        key = (slide_id, plugin)
+        self.recent_slides[key] = time.time()
+        self.recent_slides.move_to_end(key)
+        while len(self.recent_slides) > self.slide_cache.maxSize:
+            self.recent_slides.popitem(last=False)
 
     def _reset_slide_expiration(self, cache_id, expiring_slide):
-        if expiring_slide.timer is not None:
-            expiring_slide.timer.cancel()
-        expiring_slide.timer = self.event_loop.call_later(
-            self.timeout, self._sync_close_slide, cache_id
-        )
-        logger.debug(
-            "Set expiration timer for storage address (%s): %s", cache_id, self.timeout
+        # idle slides are closed by a single periodic sweep instead of a timer per slide
+        expiring_slide.last_access = time.monotonic()
+        if self.expiration_sweeper is None or self.expiration_sweeper.done():
+            self.expiration_sweeper = asyncio.create_task(self._sweep_expired_slides())
+
+    async def _sweep_expired_slides(self):
+        while True:
+            interval = min(self.timeout / 4, self.max_sweep_interval_seconds)
+            await asyncio.sleep(max(interval, 0.1))
+            expiration_time = time.monotonic() - self.timeout
+            expired_cache_ids = [
+                cache_id
+                for cache_id, exp_slide in self.slide_cache.get_all().items()
+                if exp_slide.last_access < expiration_time
+            ]
+            if expired_cache_ids:
+                await self._close_slides(expired_cache_ids)
+
+    async def _close_slides(self, cache_ids):
+        await self._close_removed_slides(
+            [(cache_id, self.slide_cache.pop_item(cache_id)) for cache_id in cache_ids]
         )
 
     async def _get_slide_storage_addresses(self, slide_id):
@@ -113,24 +456,40 @@ class SlideManager:
                 )
             slide = slide.slide_storage.model_dump()
         else:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(
-                        self.mapper_address.format(slide_id=slide_id)
-                    ) as r:
-                        if r.status == 404:
-                            raise HTTPException(
-                                status_code=404,
-                                detail=f"Could not find a storage address for slide id {slide_id}.",
-                            )
-                        slide = await r.json()
-            except aiohttp.ClientConnectorError:
-                raise HTTPException(
-                    status_code=503,
-                    detail="WSI Service is unable to connect to the Storage Mapper Service.",
+            found, is_negative, cached = self.storage_address_cache.get(slide_id)
+            if found and is_negative:
+                raise cached
+            slide = cached
+            if not found:
+                slide = await self.storage_address_lookups.run(
+                    slide_id, self._request_slide_storage, slide_id
                 )
         return slide["storage_addresses"]
 
+    async def _request_slide_storage(self, slide_id):
+        try:
+            slide = await http_client.get(self.mapper_address.format(slide_id=slide_id))
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise e
+            not_found = HTTPException(
+                status_code=404,
+                detail=f"Could not find a storage address for slide id {slide_id}.",
+            )
+            self.storage_address_cache.put_negative(slide_id, not_found)
+            raise not_found
+        except aiohttp.ClientError:
+            raise HTTPException(
+                status_code=503,
+                detail="WSI Service is unable to connect to the Storage Mapper Service.",
+            )
+        self.storage_address_cache.put(slide_id, slide)
+        return slide
+
+    async def _get_slide_storage_path(self, slide_id):
+        main_storage_address = await self._get_slide_main_storage_address(slide_id)
+        return os.path.join(self.data_dir, main_storage_address["address"])
+
     async def _get_slide_main_storage_address(self, slide_id):
         storage_addresses = await self._get_slide_storage_addresses(slide_id)
         for storage_address in storage_addresses:
@@ -138,16 +497,6 @@ class SlideManager:
                 return storage_address
         return storage_addresses[0]
 
-    def _sync_close_slide(self, cache_id):
-        asyncio.create_task(self._close_slide(cache_id))
-
-    async def _close_slide(self, cache_id):
-        if self.slide_cache.has_item(cache_id):
-            exp_slide = self.slide_cache.pop_item(cache_id)
-            self.storage_locks.pop(cache_id, None)
-            await exp_slide.slide.close()
-            logger.debug("Closed slide with storage address: %s", cache_id)
-
     def _convert_slide_info_to_match_slide_info_model(
         self, slide_info, slide_info_model
     ):
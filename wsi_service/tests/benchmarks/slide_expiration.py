@@ -0,0 +1,80 @@
+"""
+Throughput of SlideManager.get_slide for an open slide, comparing the expiration sweeper
+with the previous expiration timer that was recreated on every access.
+
+    python -m wsi_service.tests.benchmarks.slide_expiration
+"""
+
+import asyncio
+import time
+
+from wsi_service.singletons import settings
+from wsi_service.slide import HandleCost
+from wsi_service.slide_manager import SlideManager
+from wsi_service.utils.slide_utils import ExpiringSlide
+
+REQUESTS = 200_000
+CONCURRENCY = 100
+
+
+class TimerSlideManager(SlideManager):
+    # previous expiration: cancel and recreate a timer of the event loop per access
+    def _reset_slide_expiration(self, cache_id, expiring_slide):
+        timer = getattr(expiring_slide, "timer", None)
+        if timer is not None:
+            timer.cancel()
+        expiring_slide.timer = asyncio.get_running_loop().call_later(self.timeout, self._sync_close_slide, cache_id)
+
+    def _sync_close_slide(self, cache_id):
+        asyncio.create_task(self._close_slide(cache_id))
+
+    async def _close_slide(self, cache_id):
+        if self.slide_cache.has_item(cache_id):
+            exp_slide = self.slide_cache.pop_item(cache_id)
+            await exp_slide.slide.close()
+
+
+class OpenSlide:
+    plugin = "benchmark"
+    filepath = ""
+
+    def get_handle_cost(self):
+        return HandleCost(0, 1)
+
+    async def close(self):
+        pass
+
+
+async def get_slide_rate(slide_manager):
+    slide_manager.slide_cache.put_item("slide", ExpiringSlide(OpenSlide()), HandleCost(0, 1))
+
+    async def request_slides(count):
+        for _ in range(count):
+            await slide_manager.get_slide("slide")
+            # hand over to the other requests like a route would
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[request_slides(REQUESTS // CONCURRENCY) for _ in range(CONCURRENCY)])
+    rate = REQUESTS / (time.perf_counter() - start)
+    await slide_manager.close()
+    return rate
+
+
+async def main():
+    for name, slide_manager_class in [
+        ("timer per access", TimerSlideManager),
+        ("expiration sweeper", SlideManager),
+    ]:
+        slide_manager = slide_manager_class(
+            settings.mapper_address,
+            settings.data_dir,
+            settings.inactive_histo_image_timeout_seconds,
+            settings.image_handle_cache_size,
+        )
+        rate = await get_slide_rate(slide_manager)
+        print(f"{name}: {rate:,.0f} get_slide calls per second")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -48,3 +48,34 @@ def test_endpoints(aioresponses, url, status_code):
     client, _ = get_client_and_slide_manager()
     r = client.get(url)
     assert r.status_code == status_code
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/v3/slides/14b5c5dab96b540bba23b08429592bcf/tile/level/0/tile/0/0",
+        "/v3/slides/14b5c5dab96b540bba23b08429592bcf/thumbnail/max_size/1/1",
+    ],
+)
+def test_cached_endpoints_missing_slide_file(aioresponses, url):
+    aioresponses.get(
+        "http://testserver/slides/14b5c5dab96b540bba23b08429592bcf",
+        status=200,
+        payload={
+            "slide_id": "14b5c5dab96b540bba23b08429592bcf",
+            "storage_type": "fs",
+            "storage_addresses": [
+                {
+                    "address": "testcase/missing.tiff",
+                    "main_address": True,
+                    "storage_address_id": "14b5c5dab96b540bba23b08429592bcf",
+                    "slide_id": "14b5c5dab96b540bba23b08429592bcf",
+                }
+            ],
+        },
+    )
+    client, _ = get_client_and_slide_manager()
+    r = client.get(url)
+    # the error of opening the slide, not a failure of the tile cache
+    assert r.status_code == 500
+    assert "not found" in r.json()["detail"]
@@ -0,0 +1,99 @@
+import asyncio
+import io
+import json
+import threading
+import zipfile
+
+import numpy as np
+import pytest
+import tifffile
+from PIL import Image
+
+from wsi_service.utils.app_batch_utils import batch_stream_response
+from wsi_service.utils.cache_utils import EncodedImage
+from wsi_service.utils.executor_utils import PluginExecutor
+from wsi_service.utils.image_utils import ImageOutputType
+
+
+async def get_image(delay, color):
+    await asyncio.sleep(delay)
+    return Image.new("RGB", (8, 8), color)
+
+
+async def fail():
+    raise ValueError("no image")
+
+
+async def read_zip(response):
+    chunks = [chunk async for chunk in response.body_iterator]
+    return chunks, zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+
+
+@pytest.mark.asyncio
+async def test_batch_stream_response_in_request_order():
+    regions = [
+        get_image(0.02, (255, 0, 0)),
+        fail(),
+        get_image(0.0, (0, 0, 255)),
+        asyncio.sleep(0, result=EncodedImage(b"cached", "image/png")),
+    ]
+    response = batch_stream_response([None] * 4, regions, "png", 90)
+    chunks, archive = await read_zip(response)
+    # one chunk per entry and one for the central directory
+    assert len(chunks) == 5
+    assert archive.namelist() == ["t1.png", "t2.err", "t3.png", "t4.png"]
+    first = np.asarray(Image.open(io.BytesIO(archive.read("t1.png"))))
+    assert tuple(first[0, 0]) == (255, 0, 0)
+    assert "no image" in archive.read("t2.err").decode()
+    assert archive.read("t4.png") == b"cached"
+
+
+@pytest.mark.asyncio
+async def test_batch_stream_response_in_completion_order():
+    regions = [get_image(0.05, (255, 0, 0)), get_image(0.0, (0, 0, 255))]
+    response = batch_stream_response([None] * 2, regions, "jpg", 90, entry_order="completion")
+    _, archive = await read_zip(response)
+    assert archive.namelist() == ["t2.jpeg", "t1.jpeg", "index.json"]
+    assert json.loads(archive.read("index.json")) == [
+        {"index": 1, "entry": "t2.jpeg"},
+        {"index": 0, "entry": "t1.jpeg"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_stream_response_encodes_in_executor():
+    executor = PluginExecutor(4)
+    regions = [get_image(0.0, (0, 255, 0)) for _ in range(8)] + [fail()]
+    response = batch_stream_response([None] * 9, regions, "tiff", 90, executor=executor)
+    _, archive = await read_zip(response)
+    assert archive.namelist() == [f"t{i + 1}.tiff" for i in range(8)] + ["t9.err"]
+    assert "wsi-encode" in [name.split("_")[0] for name in get_thread_names()]
+    executor.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_batch_stream_response_selects_channels_of_encoded_tiles():
+    encoded_tile = io.BytesIO()
+    Image.new("RGB", (8, 8), (10, 20, 30)).save(encoded_tile, format="png")
+    regions = [asyncio.sleep(0, result=encoded_tile.getvalue()) for _ in range(2)]
+    output_types = [ImageOutputType(False, 3, np.dtype(np.uint8)), ImageOutputType(True, 3, np.dtype(np.uint8))]
+    response = batch_stream_response([None] * 2, regions, "tiff", 90, [1], output_types=output_types)
+    _, archive = await read_zip(response)
+    # tiles of slides with array regions are decoded to arrays, so the channel is selected
+    assert tifffile.imread(io.BytesIO(archive.read("t1.tiff"))).tolist() == [[[20] * 8] * 8]
+    assert tifffile.imread(io.BytesIO(archive.read("t2.tiff"))).shape == (3, 8, 8)
+
+
+@pytest.mark.asyncio
+async def test_batch_stream_response_windows_high_bit_depth_tiles():
+    regions = [asyncio.sleep(0, result=np.full((3, 8, 8), 1000, dtype=np.uint16)) for _ in range(2)]
+    slide_channel_windows = [[(0, 2000)] * 3, None]
+    response = batch_stream_response([None] * 2, regions, "png", 90, slide_channel_windows=slide_channel_windows)
+    _, archive = await read_zip(response)
+    # the same window as tiles of /slides/tile, not the intensities of the tile
+    assert np.asarray(Image.open(io.BytesIO(archive.read("t1.png"))))[0, 0].tolist() == [127] * 3
+    assert np.asarray(Image.open(io.BytesIO(archive.read("t2.png"))))[0, 0].tolist() != [127] * 3
+
+
+def get_thread_names():
+    return [thread.name for thread in threading.enumerate()]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from wsi_service.utils.async_utils import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_execution():
+    calls = []
+
+    async def open_slide(slide_id):
+        calls.append(slide_id)
+        await asyncio.sleep(0.01)
+        return object()
+
+    single_flight = SingleFlight()
+    results = await asyncio.gather(*[single_flight.run("a", open_slide, "a") for _ in range(10)])
+    assert calls == ["a"]
+    assert all(result is results[0] for result in results)
+    assert not single_flight.is_running("a")
+    # finished executions are not kept
+    await single_flight.run("a", open_slide, "a")
+    assert calls == ["a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_propagates_failures_to_all_waiters():
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("failed")
+
+    single_flight = SingleFlight()
+    results = await asyncio.gather(*[single_flight.run("a", fail) for _ in range(3)], return_exceptions=True)
+    assert len(calls) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    # failure is not cached
+    with pytest.raises(ValueError):
+        await single_flight.run("a", fail)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_cancelled_waiter():
+    async def open_slide():
+        await asyncio.sleep(0.02)
+        return "slide"
+
+    single_flight = SingleFlight()
+    first = asyncio.ensure_future(single_flight.run("a", open_slide))
+    second = asyncio.ensure_future(single_flight.run("a", open_slide))
+    await asyncio.sleep(0.005)
+    first.cancel()
+    assert await second == "slide"
@@ -0,0 +1,158 @@
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from wsi_service.utils.cache_utils import (
+    ByteLRUCache,
+    DiskCache,
+    EncodedImage,
+    SlideInfoIndex,
+    TileCache,
+    TTLCache,
+    get_encoded_padding_image,
+    make_batch_tile_cache_key,
+    make_region_cache_key,
+    make_tile_cache_key,
+)
+from wsi_service.utils.executor_utils import PluginExecutor
+from wsi_service.utils.image_utils import ImageOutputType
+
+
+def test_byte_lru_cache_evicts_by_size():
+    cache = ByteLRUCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    # "b" is least recently used now and has to make room
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"1234"
+    assert cache.size_bytes == 8
+    # items larger than the budget are not cached
+    cache.put("d", b"12345678901")
+    assert cache.get("d") is None
+    status = cache.get_status()
+    assert status["entries"] == 2
+    assert status["hits"] == 3
+    assert status["misses"] == 2
+
+
+def test_disk_cache_versions_and_eviction(tmp_path):
+    disk_cache = DiskCache(str(tmp_path / "cache.sqlite"), 100)
+    disk_cache.put("a", "v1", b"data", "image/jpeg")
+    assert disk_cache.get("a", "v1") == ("image/jpeg", b"data")
+    # outdated entries are dropped
+    assert disk_cache.get("a", "v2") is None
+    assert disk_cache.get("a", "v1") is None
+    # a second connection (e.g. another worker) sees the same entries
+    disk_cache.put("b", "v1", b"data", "image/png")
+    assert DiskCache(str(tmp_path / "cache.sqlite"), 100).get("b", "v1") == (
+        "image/png",
+        b"data",
+    )
+    for i in range(20):
+        disk_cache.put(f"c{i}", "v1", b"0123456789", "image/jpeg")
+    disk_cache.evict()
+    assert disk_cache.get_status()["size_bytes"] <= 90
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_responses(tmp_path):
+    disk_cache = DiskCache(str(tmp_path / "cache.sqlite"), 1024)
+    tile_cache = TileCache(1024, disk_cache=disk_cache, executor=PluginExecutor(1))
+    key = make_tile_cache_key("slide", None, 0, 1, 2, 0, [0, 1], "jpg", 90, (255, 255, 255))
+    assert key == make_tile_cache_key("slide", None, 0, 1, 2, 0, [0, 1], "jpeg", 90, (255, 255, 255))
+    assert await tile_cache.get_response(key, "v1") is None
+    tile_cache.put(key, "v1", EncodedImage(b"data", "image/jpeg"))
+    response = await tile_cache.get_response(key, "v1")
+    assert response.body == b"data"
+    assert response.media_type == "image/jpeg"
+    assert await tile_cache.get(key, "v2") is None
+    tile_cache.executor.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_tile_cache_served_from_disk(tmp_path):
+    executor = PluginExecutor(1)
+    disk_cache = DiskCache(str(tmp_path / "cache.sqlite"), 1024)
+    TileCache(1024, disk_cache=disk_cache, executor=executor).put("key", "v1", EncodedImage(b"data", "image/jpeg"))
+    executor.shutdown(wait=True)
+    # new worker with empty memory cache
+    tile_cache = TileCache(0, disk_cache=disk_cache, executor=executor)
+    assert await tile_cache.get("key", "v1") == EncodedImage(b"data", "image/jpeg")
+
+
+@pytest.mark.asyncio
+async def test_slide_info_index_invalidated_by_file_change(tmp_path):
+    executor = PluginExecutor(1)
+    slide_path = tmp_path / "slide.tiff"
+    slide_path.write_bytes(b"slide")
+    index = SlideInfoIndex(str(tmp_path / "index.sqlite"), 1024, executor)
+    index.put(str(slide_path), None, '{"id": ""}')
+    executor.shutdown(wait=True)
+    assert await index.get(str(slide_path), None) == '{"id": ""}'
+    assert await index.get(str(slide_path), "openslide") is None
+    slide_path.write_bytes(b"changed slide")
+    assert await index.get(str(slide_path), None) is None
+    assert await index.get(str(tmp_path / "missing.tiff"), None) is None
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = TTLCache(2, 10, negative_ttl_seconds=1)
+    cache.put("a", 1)
+    cache.put_negative("b", "not found")
+    assert cache.get("a") == (True, False, 1)
+    assert cache.get("b") == (True, True, "not found")
+    now += 5
+    assert cache.get("a") == (True, False, 1)
+    assert cache.get("b") == (False, False, None)
+    cache.put("c", 3)
+    cache.put("d", 4)
+    assert cache.get("a") == (False, False, None)
+    assert cache.get_status() == {
+        "entries": 2,
+        "hits": 2,
+        "negative_hits": 1,
+        "misses": 2,
+    }
+
+
+def test_region_cache_key_is_normalized():
+    key = make_region_cache_key("slide", None, 1, 0, 0, 512, 512, 0, [0], "jpg", 90, (255, 255, 255))
+    assert key == make_region_cache_key("slide", None, 1, 0, 0, 512, 512, 0, (0,), "jpeg", 90, [255, 255, 255])
+    assert key != make_tile_cache_key("slide", None, 1, 0, 0, 0, [0], "jpeg", 90, (255, 255, 255))
+
+
+def test_batch_tile_cache_key_differs_from_tile_cache_key():
+    # batch tiles are not padded at the image border like tiles of /slides/tile
+    key = make_batch_tile_cache_key("slide", None, 0, 1, 2, 0, None, "jpg", 90, (255, 255, 255))
+    assert key == make_batch_tile_cache_key("slide", None, 0, 1, 2, 0, None, "jpeg", 90, [255, 255, 255])
+    assert key != make_tile_cache_key("slide", None, 0, 1, 2, 0, None, "jpeg", 90, (255, 255, 255))
+
+
+@pytest.mark.asyncio
+async def test_encoded_padding_image_is_shared():
+    padding_cache = ByteLRUCache(1024, get_size=lambda image: len(image.data))
+    executor = PluginExecutor(1)
+    output_type = ImageOutputType(False, 3, np.dtype(np.uint16))
+    padding = await get_encoded_padding_image(padding_cache, executor, output_type, 16, 8, (255, 0, 0), "png", 90)
+    assert padding.media_type == "image/png"
+    image = Image.open(BytesIO(padding.data))
+    assert image.size == (16, 8) and image.getpixel((0, 0)) == (0, 0, 0)
+    assert padding is await get_encoded_padding_image(
+        padding_cache, executor, output_type, 16, 8, [255, 0, 0], "png", 90
+    )
+    output_type = ImageOutputType(True, 3, np.dtype(np.uint8))
+    padding = await get_encoded_padding_image(padding_cache, executor, output_type, 16, 8, (255, 0, 0), "png", 90)
+    assert Image.open(BytesIO(padding.data)).getpixel((0, 0)) == (255, 0, 0)
+    # padding images larger than the budget are not kept
+    await get_encoded_padding_image(padding_cache, executor, output_type, 512, 512, (255, 0, 0), "bmp", 90)
+    assert padding_cache.get_status()["entries"] == 2
+    assert padding_cache.size_bytes <= 1024
+    executor.shutdown(wait=True)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import pytest
+
+from wsi_service.slide import PooledExecutorSlide
+from wsi_service.utils.executor_utils import PluginExecutor
+
+
+async def _get_thread_name():
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_plugin_executor_runs_coroutine_in_plugin_pool():
+    executor = PluginExecutor(2, workers_per_plugin={"pil": 1})
+    thread_name = await executor.run_coroutine("pil", _get_thread_name)
+    assert thread_name.startswith("wsi-pil")
+    assert executor.get_pool("pil")._max_workers == 1
+    assert executor.get_pool("openslide")._max_workers == 2
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_plugin_executor_does_not_block_event_loop():
+    executor = PluginExecutor(1)
+    event = threading.Event()
+    blocking_call = asyncio.ensure_future(executor.run("pil", event.wait, 5))
+    # event loop is still responsive while the pool thread is blocked
+    await asyncio.sleep(0.01)
+    assert not blocking_call.done()
+    event.set()
+    assert await blocking_call
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_plugin_executor_disabled():
+    executor = PluginExecutor(1, enabled=False)
+    thread_name = await executor.run_coroutine("pil", _get_thread_name)
+    assert thread_name == threading.current_thread().name
+
+
+class LockedSlide:
+    plugin = "tifffile"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.closed = False
+
+    async def get_tile(self, level, tile_x, tile_y):
+        # a single handle serializes its reads
+        with self.lock:
+            await asyncio.sleep(0)
+            threading.Event().wait(0.05)
+        return self
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_pooled_executor_slide_reads_with_several_handles():
+    executor = PluginExecutor(8)
+
+    async def open_handle():
+        return LockedSlide()
+
+    slide = PooledExecutorSlide(LockedSlide(), executor, open_handle, 4)
+    handles = await asyncio.gather(*[slide.get_tile(0, 0, 0) for _ in range(8)])
+    assert len(set(handles)) == 4
+    assert len(slide.handles) == 4
+    await slide.close()
+    assert all(handle.closed for handle in handles)
+    executor.shutdown()
+
+
+class BlockedSlide(LockedSlide):
+    def __init__(self, release):
+        super().__init__()
+        self.release = release
+
+    async def get_tile(self, level, tile_x, tile_y):
+        await self.release.wait()
+        return self
+
+
+@pytest.mark.asyncio
+async def test_pooled_executor_slide_close_while_read_pending():
+    executor = PluginExecutor(2, enabled=False)
+    release = asyncio.Event()
+    late_handles = []
+
+    async def open_handle():
+        await release.wait()
+        late_handles.append(BlockedSlide(release))
+        return late_handles[-1]
+
+    slide = PooledExecutorSlide(BlockedSlide(release), executor, open_handle, 2)
+    pending_read = asyncio.create_task(slide.get_tile(0, 0, 0))
+    pending_open = asyncio.create_task(slide.get_tile(0, 0, 0))
+    await asyncio.sleep(0)
+    await slide.close()
+    assert not slide.slide.closed
+    release.set()
+    handle = await pending_read
+    assert handle.closed
+    with pytest.raises(RuntimeError):
+        await pending_open
+    assert late_handles[0].closed
+    assert slide.handles == []
+    assert slide.idle_handles == []
+    executor.shutdown()
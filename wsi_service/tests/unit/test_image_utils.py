@@ -1,17 +1,33 @@
+import asyncio
+import tracemalloc
+from io import BytesIO
+from types import SimpleNamespace
+
 import numpy as np
+import pytest
 from PIL import Image
 from PIL.ImageStat import Stat
 
 from wsi_service.models.v3.slide import SlideColor
 from wsi_service.utils.image_utils import (
+    ImageOutputType,
+    composite_channels,
     convert_int_to_rgba_array,
     convert_narray_to_pil_image,
+    convert_narray_to_uint8_by_channel,
     convert_narray_uintX_to_uint8,
     convert_rgba_array_to_int,
+    create_padding_image,
+    downsample_by_two,
+    get_extended_region,
+    get_extended_tile,
+    get_image_output_type,
     get_multi_channel_as_rgb,
     get_requested_channels_as_array,
     get_requested_channels_as_rgb_array,
     get_single_channel,
+    get_uint8_lookup_table,
+    open_encoded_image,
     rgba_to_rgb_with_background_color,
 )
 
@@ -37,6 +53,26 @@ def test_convert_narray_uintX_to_uint8():
     assert result.all()
 
 
+def test_convert_narray_uintX_to_uint8_clips_values_below_lower_bound():
+    array = np.array([[[50, 100, 150, 20000]]], dtype=np.uint16)
+    c_array = convert_narray_uintX_to_uint8(array, 16, 100, 10000)
+    assert c_array.tolist() == [[[0, 0, 1, 255]]]
+
+
+def test_convert_narray_uintX_to_uint8_float_matches_lookup_table():
+    c_array_uint16 = convert_narray_uintX_to_uint8(ndarray, 16, 100, 10000)
+    c_array_float32 = convert_narray_uintX_to_uint8(ndarray.astype(np.float32), 32, 100, 10000)
+    assert c_array_float32.dtype == np.uint8
+    assert (c_array_uint16 == c_array_float32).all()
+
+
+def test_uint8_lookup_tables_are_cached():
+    table = get_uint8_lookup_table(16, 100.0, 10000.0)
+    assert table is get_uint8_lookup_table(16, 100.0, 10000.0)
+    assert table.shape == (65536,)
+    assert not table.flags.writeable
+
+
 def test_convert_int_to_rgba_array():
     array = convert_int_to_rgba_array(16777215)
     assert array == [0, 255, 255, 255]
@@ -80,6 +116,53 @@ def test_get_requested_channels_as_array():
     assert len(req_channels) == 2
 
 
+def test_composite_channels():
+    narray = np.zeros((2, 2, 2), dtype=np.uint16)
+    narray[0, 0, 0] = 1000
+    narray[1, 0, 1] = 500
+    narray[1, 1, 1] = 2000
+    rgb = composite_channels(narray, [(255, 0, 0), (0, 255, 255)], [0, 0], [1000, 1000])
+    assert rgb.shape == (3, 2, 2)
+    assert rgb.dtype == np.uint8
+    assert list(rgb[:, 0, 0]) == [255, 0, 0]
+    assert list(rgb[:, 0, 1]) == [0, 128, 128]
+    # values above the window are clipped
+    assert list(rgb[:, 1, 1]) == [0, 255, 255]
+    assert list(rgb[:, 1, 0]) == [0, 0, 0]
+
+
+def test_composite_channels_default_windows():
+    rgb = composite_channels(ndarray[:1], [(0, 255, 0)], [None], [None])
+    assert rgb[1].max() == 255
+    assert rgb[1].min() == 0
+    assert rgb[0].max() == 0
+
+
+@pytest.mark.parametrize("channel_count", [3, 8, 40])
+def test_channel_selection_allocations(channel_count):
+    # planes allocated for channel selection of a 512x512 uint16 tile do not grow with channels
+    narray = np.ones((channel_count, 512, 512), dtype=np.uint16)
+    plane_size = 512 * 512 * 2
+    last = channel_count - 1
+    allocations = {}
+    for name, select in [
+        ("rgb", lambda: get_requested_channels_as_rgb_array(narray, None, None)),
+        ("single", lambda: get_requested_channels_as_rgb_array(narray, [last], None)),
+        ("two", lambda: get_requested_channels_as_rgb_array(narray, [0, last], None)),
+        ("raw", lambda: get_requested_channels_as_array(narray, [0, 2])),
+    ]:
+        tracemalloc.start()
+        result = select()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert result.dtype == np.uint16
+        allocations[name] = round(peak / plane_size, 1)
+    assert allocations["rgb"] < 0.1
+    assert allocations["single"] < 0.1
+    assert allocations["two"] <= 3.1
+    assert allocations["raw"] <= 2.1
+
+
 def test_rgba_to_rgb_with_background_color():
     # expect completely transperant image to become white
     image_rgba = Image.new("RGBA", (256, 256), (0, 0, 0, 0))
@@ -108,3 +191,96 @@ def test_rgba_to_rgb_with_background_color():
         image_rgba, padding_color=(255, 255, 255)
     )
     assert sum(Stat(image_rgb).mean) / 3 == 127.5
+
+
+def test_convert_narray_to_uint8_by_channel():
+    narray = np.array([[[100, 200]], [[1000, 3000]], [[7, 7]]], dtype=np.uint16)
+    narray_uint8 = convert_narray_to_uint8_by_channel(narray, [(100, 200), (0, 3000)])
+    assert narray_uint8.dtype == np.uint8
+    assert list(narray_uint8[0, 0]) == [0, 255]
+    assert list(narray_uint8[1, 0]) == [85, 255]
+    # channels without a window stay empty
+    assert list(narray_uint8[2, 0]) == [0, 0]
+
+
+@pytest.mark.parametrize("rows_per_block", [1, 1024])
+def test_downsample_by_two(rows_per_block):
+    source = np.arange(5 * 3 * 2, dtype=np.uint8).reshape(5, 3, 2) * 8
+    target = np.zeros((3, 2, 2), dtype=np.uint8)
+    downsample_by_two(source, target, rows_per_block=rows_per_block)
+    expected = np.pad(source.astype(float), ((0, 1), (0, 1), (0, 0)), mode="edge")
+    expected = expected.reshape(3, 2, 2, 2, 2).mean(axis=(1, 3))
+    assert np.array_equal(target, np.floor(expected + 0.5).astype(np.uint8))
+
+
+def make_slide_info(extent_x, extent_y, tile_extent=256):
+    extent = SimpleNamespace(x=extent_x, y=extent_y)
+    return SimpleNamespace(
+        levels=[SimpleNamespace(extent=extent)],
+        tile_extent=SimpleNamespace(x=tile_extent, y=tile_extent),
+    )
+
+
+def test_get_image_output_type_and_padding_image():
+    output_type = get_image_output_type(np.ones((2, 4, 4), dtype=np.uint16))
+    assert output_type == (False, 2, np.uint16)
+    padding = create_padding_image(output_type, 5, 3, (255, 255, 255))
+    assert padding.shape == (2, 3, 5) and padding.dtype == np.uint16
+    assert not padding.any()
+    output_type = get_image_output_type(Image.new("RGB", (4, 4)))
+    padding = create_padding_image(output_type, 5, 3, (255, 0, 0))
+    assert padding.size == (5, 3) and padding.getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_get_extended_tile_outside_image_without_reads():
+    slide_info = make_slide_info(300, 200)
+    output_type = get_image_output_type(np.zeros((3, 1, 1), dtype=np.uint8))
+
+    async def get_tile(*args, **kwargs):
+        raise AssertionError("tiles outside of the image are not read")
+
+    for tile_x, tile_y in [(2, 0), (0, 1), (-1, 0)]:
+        tile = asyncio.run(get_extended_tile(get_tile, slide_info, 0, tile_x, tile_y, output_type=output_type))
+        assert tile.shape == (3, 256, 256) and not tile.any()
+
+
+def test_get_extended_tile_and_region_partial_overlap():
+    slide_info = make_slide_info(300, 200)
+
+    async def get_tile(level, tile_x, tile_y, padding_color=None, z=0):
+        return np.ones((2, 256, 256), dtype=np.uint16)
+
+    async def get_region(level, start_x, start_y, size_x, size_y, **kwargs):
+        return np.ones((2, size_y, size_x), dtype=np.uint16)
+
+    tile = asyncio.run(get_extended_tile(get_tile, slide_info, 0, 1, 0))
+    assert tile.shape == (2, 256, 256) and tile.dtype == np.uint16
+    assert tile[:, :200, :44].all() and not tile[:, 200:].any()
+    assert not tile[:, :, 44:].any()
+    region = asyncio.run(get_extended_region(get_region, slide_info, 0, -10, 190, 20, 20))
+    assert region.shape == (2, 20, 20)
+    assert region[:, :10, 10:].all()
+    assert not region[:, 10:].any() and not region[:, :, :10].any()
+
+
+def test_open_encoded_image_as_array():
+    encoded_image = BytesIO()
+    Image.new("RGB", (5, 3), (10, 20, 30)).save(encoded_image, format="png")
+    image = open_encoded_image(encoded_image.getvalue())
+    assert isinstance(image, Image.Image) and image.size == (5, 3)
+    narray = open_encoded_image(encoded_image.getvalue(), ImageOutputType(False, 3, np.dtype(np.uint8)))
+    assert narray.shape == (3, 3, 5) and narray[:, 0, 0].tolist() == [10, 20, 30]
+
+
+def test_get_extended_tile_decodes_encoded_tiles_like_regions():
+    slide_info = make_slide_info(300, 200)
+    encoded_tile = BytesIO()
+    Image.new("RGB", (256, 256), (10, 20, 30)).save(encoded_tile, format="png")
+
+    async def get_tile(level, tile_x, tile_y, padding_color=None, z=0):
+        return encoded_tile.getvalue()
+
+    output_type = ImageOutputType(False, 3, np.dtype(np.uint8))
+    tile = asyncio.run(get_extended_tile(get_tile, slide_info, 0, 1, 0, output_type=output_type))
+    assert tile.shape == (3, 256, 256)
+    assert tile[:, 0, 0].tolist() == [10, 20, 30] and not tile[:, :, 44:].any()
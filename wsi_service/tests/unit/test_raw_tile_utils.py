@@ -0,0 +1,85 @@
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import tifffile
+from PIL import Image
+
+from wsi_service.utils.raw_tile_utils import (
+    get_encoded_frame,
+    get_raw_tile,
+    get_raw_tile_page,
+    read_raw_tile,
+    sniff_image_format,
+)
+
+
+def write_tiled_tiff(filepath, compression):
+    image = np.zeros((512, 384, 3), dtype=np.uint8)
+    image[:256, :256] = (200, 40, 40)
+    image[256:, 256:] = (40, 40, 200)
+    tifffile.imwrite(
+        filepath,
+        image,
+        tile=(256, 256),
+        compression=compression,
+        photometric="rgb",
+    )
+    return image
+
+
+@pytest.mark.parametrize(
+    "compression, image_format, tolerance",
+    [("jpeg", "jpeg", 2), ("jpeg2000", "jp2", 0), ("webp", "webp", 0)],
+)
+def test_get_raw_tile(tmp_path, compression, image_format, tolerance):
+    filepath = str(tmp_path / "slide.tif")
+    image = write_tiled_tiff(filepath, compression)
+    with tifffile.TiffFile(filepath) as tif:
+        tif_level = tif.series[0].levels[0]
+        assert get_raw_tile_page(tif_level, SimpleNamespace(x=512, y=512)) is None
+        page = get_raw_tile_page(tif_level, SimpleNamespace(x=256, y=256))
+        assert page is not None
+        assert get_raw_tile(page, 2, 0) is None
+        for tile_x, tile_y in [(0, 0), (1, 1)]:
+            tile = get_raw_tile(page, tile_x, tile_y)
+            assert sniff_image_format(tile) == image_format
+            decoded = np.asarray(Image.open(io.BytesIO(tile)).convert("RGB"))
+            expected = image[tile_y * 256 : (tile_y + 1) * 256, tile_x * 256 : (tile_x + 1) * 256]
+            region = decoded[: expected.shape[0], : expected.shape[1]].astype(int)
+            assert np.abs(region - expected).mean() <= tolerance
+
+
+def test_read_raw_tile_from_file_and_stream(tmp_path):
+    filepath = str(tmp_path / "slide.tif")
+    write_tiled_tiff(filepath, "jpeg")
+    with open(filepath, "rb") as f:
+        stream = io.BytesIO(f.read())
+    with tifffile.TiffFile(filepath) as tif, tifffile.TiffFile(stream) as tif_stream:
+        # positional read from the file, seek and read without file descriptor
+        tiles = [read_raw_tile(t.series[0].levels[0].pages[0], 1, 1) for t in [tif, tif_stream]]
+    assert tiles[0] == tiles[1]
+    assert tiles[0].startswith(b"\xff\xd8")
+
+
+def test_get_raw_tile_page_requires_supported_compression(tmp_path):
+    filepath = str(tmp_path / "slide.tif")
+    write_tiled_tiff(filepath, "zlib")
+    with tifffile.TiffFile(filepath) as tif:
+        tif_level = tif.series[0].levels[0]
+        assert get_raw_tile_page(tif_level, SimpleNamespace(x=256, y=256)) is None
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L"])
+def test_get_encoded_frame_wraps_j2k_codestream(mode):
+    image = Image.new(mode, (64, 32), 120)
+    mem = io.BytesIO()
+    image.save(mem, format="JPEG2000", no_jp2=True)
+    frame = get_encoded_frame(mem.getvalue())
+    assert sniff_image_format(frame) == "jp2"
+    decoded = Image.open(io.BytesIO(frame))
+    assert decoded.size == (64, 32)
+    assert decoded.mode == mode
+    assert np.array_equal(np.asarray(decoded), np.asarray(image))
+    assert get_encoded_frame(b"\x00" * 16) is None
@@ -1,9 +1,12 @@
 import asyncio
+import json
 
 import pytest
 from fastapi.exceptions import HTTPException
 
+from wsi_service.slide import HandleCost
 from wsi_service.tests.unit.test_client import get_client_and_slide_manager
+from wsi_service.utils.slide_utils import ExpiringSlide
 
 
 @pytest.mark.asyncio
@@ -25,7 +28,7 @@ async def test_slide_manager_timeout(aioresponses):
         },
     )
     _, slide_manager = get_client_and_slide_manager()
-    slide_manager.close()
+    await slide_manager.close()
     slide_manager.timeout = 1
     assert len(slide_manager.slide_cache.get_all()) == 0
     await slide_manager.get_slide("750129436e215175beb6c979bd9bfa50")
@@ -65,7 +68,7 @@ async def test_exceed_cache_limit(aioresponses):
             },
         )
     _, slide_manager = get_client_and_slide_manager()
-    slide_manager.close()
+    await slide_manager.close()
 
     for i in range(3):
         assert len(slide_manager.slide_cache.get_all()) == i
@@ -80,3 +83,105 @@ async def test_exceed_cache_limit(aioresponses):
             assert slide_manager.slide_cache.has_item(
                 f"/wsi-service/wsi_service/tests/unit/data/testcase/CMU-{i}-small.tiff"
             )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_slide_opens_slide_once(aioresponses):
+    aioresponses.get(
+        "http://testserver/slides/750129436e215175beb6c979bd9bfa50",
+        status=200,
+        payload={
+            "slide_id": "750129436e215175beb6c979bd9bfa50",
+            "storage_type": "fs",
+            "storage_addresses": [
+                {
+                    "address": "testcase/CMU-1-small.tiff",
+                    "main_address": True,
+                    "storage_address_id": "8d32dba05a4558218880f06caf30d3ac",
+                    "slide_id": "750129436e215175beb6c979bd9bfa50",
+                }
+            ],
+        },
+        repeat=True,
+    )
+    _, slide_manager = get_client_and_slide_manager()
+    await slide_manager.close()
+    slides = await asyncio.gather(*[slide_manager.get_slide("750129436e215175beb6c979bd9bfa50") for _ in range(5)])
+    assert all(slide is slides[0] for slide in slides)
+    assert len(slide_manager.slide_cache.get_all()) == 1
+
+
+@pytest.mark.asyncio
+async def test_close_waits_for_slides_before_executor_shutdown(monkeypatch):
+    _, slide_manager = get_client_and_slide_manager()
+    events = []
+
+    class ClosingSlide:
+        plugin = "test"
+
+        async def close(self):
+            await asyncio.sleep(0)
+            events.append("slide closed")
+
+    slide_manager.slide_cache.put_item("slide", ExpiringSlide(ClosingSlide()), HandleCost(0, 1))
+    monkeypatch.setattr(slide_manager.executor, "shutdown", lambda: events.append("executor shut down"))
+    await slide_manager.close()
+    assert events == ["slide closed", "executor shut down"]
+    assert len(slide_manager.slide_cache.get_all()) == 0
+
+
+@pytest.mark.asyncio
+async def test_evicted_slides_closed_in_tracked_tasks():
+    _, slide_manager = get_client_and_slide_manager()
+    closed = []
+
+    class ClosingSlide:
+        plugin = "test"
+
+        def __init__(self, name, memory_bytes):
+            self.name = name
+            self.memory_bytes = memory_bytes
+
+        def get_handle_cost(self):
+            return HandleCost(self.memory_bytes, 1)
+
+        async def close(self):
+            await asyncio.sleep(0)
+            closed.append(self.name)
+
+    slide_manager.slide_cache.max_memory_bytes = 10
+    slide_manager.slide_cache.put_item("a", ExpiringSlide(ClosingSlide("a", 1)), HandleCost(1, 1))
+    slide_manager.slide_cache.put_item("b", ExpiringSlide(ClosingSlide("b", 1)), HandleCost(1, 1))
+    # the cost of "b" grows beyond the budget, "a" is evicted and closed in the background
+    slide_manager.slide_cache.get_item("b").slide.memory_bytes = 20
+    await slide_manager.get_slide("b")
+    assert len(slide_manager.closing_tasks) == 1
+    await slide_manager.close()
+    assert sorted(closed) == ["a", "b"]
+    assert len(slide_manager.closing_tasks) == 0
+
+
+def test_recent_slides_written_most_recent_first(tmp_path):
+    _, slide_manager = get_client_and_slide_manager()
+    asyncio.run(slide_manager.close())
+    slides_file = str(tmp_path / "recent_slides.json")
+    for slide_id in ["a", "b", "a", "c"]:
+        slide_manager._record_slide_access(slide_id, None)
+    slide_manager.write_recent_slides(slides_file)
+    with open(slides_file) as f:
+        assert [item[:2] for item in json.load(f)] == [["c", None], ["a", None], ["b", None]]
+
+
+def test_recent_slides_merged_with_other_workers(tmp_path, monkeypatch):
+    _, slide_manager = get_client_and_slide_manager()
+    asyncio.run(slide_manager.close())
+    slides_file = str(tmp_path / "recent_slides.json")
+    # written by another worker on shutdown
+    with open(slides_file, "w") as f:
+        json.dump([["x", None, 300.0], ["a", None, 100.0]], f)
+    for slide_id, accessed_at in [("a", 200.0), ("c", 400.0)]:
+        monkeypatch.setattr("time.time", lambda: accessed_at)
+        slide_manager._record_slide_access(slide_id, None)
+    slide_manager.write_recent_slides(slides_file)
+    with open(slides_file) as f:
+        assert json.load(f) == [["c", None, 400.0], ["x", None, 300.0], ["a", None, 200.0]]
@@ -1,4 +1,9 @@
-from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
+from wsi_service.slide import HandleCost
+from wsi_service.utils.slide_utils import (
+    SlideHandleCache,
+    get_original_levels,
+    get_rgb_channel_list,
+)
 
 
 def test_get_original_levels():
@@ -27,3 +32,24 @@ def test_get_rgb_channel_list():
         assert channels[i].color.g == rgba[i][1]
         assert channels[i].color.b == rgba[i][2]
         assert channels[i].color.a == rgba[i][3]
+
+
+def test_slide_handle_cache_evicts_by_cost():
+    cache = SlideHandleCache(10, max_memory_bytes=100, max_file_descriptors=3)
+    assert cache.put_item("a", "slide a", HandleCost(60, 1)) == []
+    assert cache.put_item("b", "slide b", HandleCost(30, 1)) == []
+    cache.get_item("a")
+    # least recently used slide b is closed for memory
+    assert cache.put_item("c", "slide c", HandleCost(30, 1)) == [("b", "slide b")]
+    # file descriptors
+    cache.update_cost("c", HandleCost(30, 3))
+    assert cache.evict() == [("a", "slide a")]
+    status = cache.get_status()
+    assert status["entries"] == 1
+    assert status["size_bytes"] == 30
+    assert status["file_descriptors"] == 3
+    # a single slide above the budget stays open
+    cache.update_cost("c", HandleCost(1000, 10))
+    assert cache.evict() == []
+    cache.pop_item("c")
+    assert cache.get_status()["size_bytes"] == 0
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from wsi_service.utils.statistics_utils import (
+    compute_channel_statistics,
+    get_channel_windows,
+    get_statistics_level,
+    histogram_bins,
+)
+
+
+def make_slide_info(extents):
+    levels = [SimpleNamespace(extent=SimpleNamespace(x=x, y=y)) for x, y in extents]
+    return SimpleNamespace(levels=levels)
+
+
+def test_get_statistics_level():
+    slide_info = make_slide_info([(4000, 4000), (2000, 2000), (1000, 1000)])
+    assert get_statistics_level(slide_info, 4_000_000) == 1
+    assert get_statistics_level(slide_info, 100_000_000) == 0
+    # lowest resolution level if no level is small enough
+    assert get_statistics_level(slide_info, 1000) == 2
+
+
+def test_compute_channel_statistics():
+    narray = np.zeros((2, 100, 100), dtype=np.uint16)
+    narray[0] = np.arange(10000, dtype=np.uint16).reshape(100, 100)
+    narray[1] = 500
+    channel_statistics = compute_channel_statistics(narray, 3)
+    assert channel_statistics["level"] == 3
+    first, second = channel_statistics["channels"]
+    assert first["min"] == 0
+    assert first["max"] == 9999
+    assert len(first["histogram"]) == histogram_bins
+    assert sum(first["histogram"]) == 10000
+    assert 0 < first["window_min"] < 100
+    assert 9900 < first["window_max"] < 9999
+    assert second["window_min"] == second["window_max"] == 500
+    windows = get_channel_windows(channel_statistics)
+    assert windows[1] == (500, 500)
+
+
+def test_compute_channel_statistics_of_pil_image():
+    image = Image.new("RGB", (10, 10), (255, 0, 128))
+    channel_statistics = compute_channel_statistics(image, 0)
+    assert [channel["mean"] for channel in channel_statistics["channels"]] == [
+        255,
+        0,
+        128,
+    ]
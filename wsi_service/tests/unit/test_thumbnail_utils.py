@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from wsi_service.utils.thumbnail_utils import (
+    downsample_box,
+    get_image_file_thumbnail,
+    get_thumbnail_array,
+    get_thumbnail_level,
+    get_thumbnail_size,
+    resize_thumbnail_array,
+)
+
+
+def make_slide_info(extents):
+    levels = [SimpleNamespace(extent=SimpleNamespace(x=x, y=y)) for x, y in extents]
+    return SimpleNamespace(extent=levels[0].extent, levels=levels)
+
+
+def test_get_thumbnail_size():
+    assert get_thumbnail_size(1000, 700, 100, 100) == (100, 70)
+    assert get_thumbnail_size(700, 1000, 100, 50) == (35, 50)
+    # images are not enlarged
+    assert get_thumbnail_size(80, 60, 100, 100) == (80, 60)
+
+
+def test_get_thumbnail_level():
+    slide_info = make_slide_info([(4000, 3000), (2000, 1500), (1000, 750), (500, 375)])
+    assert get_thumbnail_level(slide_info, 500, 375) == 3
+    assert get_thumbnail_level(slide_info, 501, 375) == 2
+    assert get_thumbnail_level(slide_info, 5000, 5000) == 0
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.float32])
+def test_downsample_box(dtype):
+    narray = np.arange(2 * 4 * 6, dtype=dtype).reshape(2, 4, 6)
+    result = downsample_box(narray, 3, 2)
+    expected = narray.astype(np.float64).reshape(2, 2, 2, 3, 2).mean(axis=(2, 4))
+    assert result.dtype == dtype
+    assert np.allclose(result, expected, atol=0.5)
+
+
+def test_downsample_box_uneven_and_channels_last():
+    narray = np.array([[0, 10, 20, 30, 40]], dtype=np.uint8).reshape(1, 5, 1)
+    # source pixels [0, 10], [20, 30, 40] are averaged
+    result = downsample_box(narray, 2, 1, channel_axis=2)
+    assert result[0, :, 0].tolist() == [5, 30]
+    assert resize_thumbnail_array(narray, 2, 2, channel_axis=2).shape == (1, 2, 1)
+
+
+def test_get_thumbnail_array():
+    regions = []
+
+    class ArraySlide:
+        slide_info = make_slide_info([(400, 200), (200, 100), (100, 50)])
+
+        async def get_info(self):
+            return self.slide_info
+
+        async def get_region(self, level, start_x, start_y, size_x, size_y):
+            regions.append((level, size_x, size_y))
+            return np.full((3, size_y, size_x), 7, dtype=np.uint16)
+
+    thumbnail = asyncio.run(get_thumbnail_array(ArraySlide(), 150, 150))
+    # smallest level that is larger than the thumbnail of 150 x 75 pixels
+    assert regions == [(1, 200, 100)]
+    assert thumbnail.shape == (3, 75, 150)
+    assert thumbnail.dtype == np.uint16 and (thumbnail == 7).all()
+
+
+def test_get_image_file_thumbnail(tmp_path):
+    filepath = str(tmp_path / "image.jpg")
+    Image.new("RGB", (1600, 800), (200, 40, 40)).save(filepath)
+    thumbnail = get_image_file_thumbnail(filepath, 100, 100)
+    assert thumbnail.size == (100, 50)
+    assert thumbnail.mode == "RGB"
@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+import pytest
+import tifffile
+
+from wsi_service.utils import tiff_utils
+from wsi_service.utils.cache_utils import ByteLRUCache
+from wsi_service.utils.tiff_utils import coalesce_byte_ranges, read_tiled_page_region
+
+
+def write_tiled_tiff(filepath, shape, dtype, photometric):
+    image = (np.arange(np.prod(shape)) % np.iinfo(dtype).max).astype(dtype)
+    image = image.reshape(shape)
+    tifffile.imwrite(filepath, image, tile=(64, 48), compression="zlib", photometric=photometric)
+    return image.reshape(shape[:2] + (-1,))
+
+
+@pytest.mark.parametrize(
+    "start_row, start_column, rows, columns",
+    [(0, 0, 300, 200), (70, 50, 100, 90), (250, 150, 100, 100), (10, 10, 1, 1)],
+)
+@pytest.mark.parametrize(
+    "shape, dtype, photometric",
+    [((300, 200), np.uint16, "minisblack"), ((300, 200, 3), np.uint8, "rgb")],
+)
+@pytest.mark.parametrize("from_stream", [False, True])
+def test_read_tiled_page_region(
+    tmp_path,
+    start_row,
+    start_column,
+    rows,
+    columns,
+    shape,
+    dtype,
+    photometric,
+    from_stream,
+):
+    filepath = str(tmp_path / "slide.tif")
+    image = write_tiled_tiff(filepath, shape, dtype, photometric)
+    if from_stream:
+        with open(filepath, "rb") as f:
+            filepath = io.BytesIO(f.read())
+    with tifffile.TiffFile(filepath) as tif:
+        region = read_tiled_page_region(tif.pages[0], start_row, start_column, rows, columns, 0)
+    expected = image[start_row : start_row + rows, start_column : start_column + columns]
+    assert region.shape[0] == 1 and region.shape[3] == expected.shape[2]
+    assert region.shape[1] >= expected.shape[0] and region.shape[2] >= expected.shape[1]
+    assert np.array_equal(region[0, : expected.shape[0], : expected.shape[1]], expected)
+
+
+def test_read_tiled_page_region_uses_decoded_tile_cache(tmp_path, monkeypatch):
+    cache = ByteLRUCache(10_000_000, get_size=lambda tile: tile.nbytes)
+    monkeypatch.setattr(tiff_utils, "decoded_tile_cache", cache)
+    filepath = str(tmp_path / "slide.tif")
+    image = write_tiled_tiff(filepath, (300, 200, 3), np.uint8, "rgb")
+    tile_cache_id = tiff_utils.get_tile_cache_id(filepath)
+    with tifffile.TiffFile(filepath) as tif:
+        page = tif.pages[0]
+        first = read_tiled_page_region(page, 0, 0, 100, 60, 0, None, tile_cache_id)
+        # overlapping region, the shared tiles are not decoded again
+        second = read_tiled_page_region(page, 50, 30, 100, 60, 0, None, tile_cache_id)
+    assert cache.get_status()["entries"] == 6
+    assert cache.hits == 4
+    assert np.array_equal(first[0], image[:100, :60])
+    assert np.array_equal(second[0, :100, :60], image[50:150, 30:90])
+
+
+def test_coalesce_byte_ranges(monkeypatch):
+    monkeypatch.setattr(tiff_utils, "max_read_gap_bytes", 10)
+    monkeypatch.setattr(tiff_utils, "max_read_size_bytes", 100)
+    groups = coalesce_byte_ranges([(0, 20), (25, 20), (100, 10), (112, 90)])
+    assert groups == [[(0, 20), (25, 20)], [(100, 10)], [(112, 90)]]
@@ -1,15 +1,19 @@
-from io import BytesIO
+import asyncio
+import io
+import json
 
 import zipfile
 import tifffile
 from fastapi import HTTPException
-from PIL import Image
-from starlette.responses import Response
+from starlette.responses import StreamingResponse
 
 from wsi_service.models.v3.slide import SlideInfo
+from wsi_service.utils.cache_utils import EncodedImage
 from wsi_service.utils.image_utils import save_rgb_image
 
 from wsi_service.utils.app_utils import (
+    is_passthrough_possible,
+    open_encoded_image,
     process_image_region,
     process_image_region_raw,
     validate_image_level,
@@ -23,7 +27,7 @@ from wsi_service.utils.app_utils import (
 async def safe_get_slide(slide_manager, path, plugin):
     try:
         return await slide_manager.get_slide(path, plugin=plugin)
-    except Exception as e:
+    except Exception:
         return None  # todo consider keeping the error message
 
 
@@ -36,81 +40,306 @@ async def safe_get_slide_for_query(slide_manager, path, plugin):
         return {"detail": getattr(e, "message", repr(e))}
 
 
+async def safe_get_slide_version(slide_manager, path, plugin):
+    try:
+        return await slide_manager.get_slide_version(path, plugin=plugin)
+    except Exception:
+        return None  # no caching without a known slide version
+
+
 async def safe_get_slide_info(slide):
     if slide is None:
         return None
     try:
         return await slide.get_info()
-    except Exception as e:
+    except Exception:
         return None  # todo consider keeping the error message
 
 
-def batch_safe_make_response(
-    slides, image_regions, image_format, image_quality, image_channels=None
+async def safe_get_output_type(slide):
+    if slide is None:
+        return None
+    try:
+        return await slide.get_output_type()
+    except Exception:
+        return None  # encoded tiles are decoded to pillow images
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Unseekable sink for zipfile.ZipFile that collects the written archive in chunks.
+    zipfile writes data descriptors instead of seeking back, so entries can be sent as
+    soon as they are written.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def batch_stream_response(
+    slides,
+    image_regions,
+    image_format,
+    image_quality,
+    image_channels=None,
+    tile_cache=None,
+    cache_keys=None,
+    cache_versions=None,
+    entry_order="request",
+    executor=None,
+    output_types=None,
+    slide_channel_windows=None,
 ):
-    # Create a ZipFile and add the NumPy array as an entry named 't1'
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_STORED) as zip:
-        for i in range(len(slides)):
-            image_region = image_regions[i]
-            slide = slides[i]
-
-            if isinstance(image_region, bytes):
-                if image_format == "jpeg":
-                    zip.writestr(f"t{i + 1}.jpeg", image_region)
-                    continue
-                else:
-                    image_region = Image.open(BytesIO(image_region))
-
-            if image_format == "tiff":
-                mem = BytesIO()
-                try:
-                    # return raw image region as tiff
-                    narray = process_image_region_raw(image_region, image_channels)
-                    if image_format in alternative_spellings:
-                        image_format = alternative_spellings[image_format]
-
-                    if image_format not in supported_image_formats:
-                        raise HTTPException(
-                            status_code=400,
-                            detail="Provided image format parameter not supported for OME tiff",
-                        )
-                    if narray.shape[0] == 1:
-                        tifffile.imwrite(
-                            mem, narray, photometric="minisblack", compression="DEFLATE"
-                        )
-                    else:
-                        tifffile.imwrite(
-                            mem,
-                            narray,
-                            photometric="minisblack",
-                            planarconfig="separate",
-                            compression="DEFLATE",
-                        )
-                    mem.seek(0)
-                    zip.writestr(f"t{i + 1}.{image_format}", mem.getvalue())
-                except Exception as ex:
-                    # just indicate error --> empty archive
-                    zip.writestr(f"t{i + 1}.err", getattr(ex, "message", repr(ex)))
-            else:
-                try:
-                    # return image region
-                    img = process_image_region(slide, image_region, image_channels)
-                    if image_format in alternative_spellings:
-                        image_format = alternative_spellings[image_format]
-
-                    if image_format not in supported_image_formats:
-                        raise HTTPException(
-                            status_code=400,
-                            detail="Provided image format parameter not supported",
-                        )
-
-                    mem = save_rgb_image(img, image_format, image_quality)
-                    zip.writestr(f"t{i + 1}.{image_format}", mem.getvalue())
-                except Exception as ex:
-                    # just indicate error --> empty archive
-                    zip.writestr(f"t{i + 1}.err", getattr(ex, "message", repr(ex)))
-    return Response(zip_buffer.getvalue(), media_type="application/zip")
+    # image_regions are awaitables, all items are read and encoded concurrently
+    tasks = [
+        asyncio.ensure_future(
+            get_batch_entry_when_ready(
+                i,
+                slides[i],
+                image_region,
+                image_format,
+                image_quality,
+                image_channels,
+                tile_cache,
+                cache_keys[i] if cache_keys is not None else None,
+                cache_versions[i] if cache_versions is not None else None,
+                executor,
+                output_types[i] if output_types is not None else None,
+                slide_channel_windows[i] if slide_channel_windows is not None else None,
+            )
+        )
+        for i, image_region in enumerate(image_regions)
+    ]
+    return StreamingResponse(
+        stream_zip_entries(tasks, entry_order), media_type="application/zip"
+    )
+
+
+async def get_batch_entry_when_ready(
+    i,
+    slide,
+    image_region,
+    image_format,
+    image_quality,
+    image_channels,
+    tile_cache,
+    cache_key,
+    cache_version,
+    executor,
+    output_type=None,
+    channel_windows=None,
+):
+    try:
+        image_region = await image_region
+    except Exception as ex:
+        return get_error_entry(i, ex)
+    if executor is None or isinstance(image_region, EncodedImage):
+        return get_batch_entry(
+            i,
+            slide,
+            image_region,
+            image_format,
+            image_quality,
+            image_channels,
+            tile_cache,
+            cache_key,
+            cache_version,
+            output_type,
+            channel_windows,
+        )
+    # encoding is cpu bound, items are encoded in parallel off the event loop
+    return await executor.run(
+        "encode",
+        get_batch_entry,
+        i,
+        slide,
+        image_region,
+        image_format,
+        image_quality,
+        image_channels,
+        tile_cache,
+        cache_key,
+        cache_version,
+        output_type,
+        channel_windows,
+    )
+
+
+async def stream_zip_entries(tasks, entry_order):
+    stream = ZipStream()
+    manifest = []
+    try:
+        with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as zip:
+            async for i, task in iterate_finished_tasks(tasks, entry_order):
+                name, data = task.result()
+                zip.writestr(name, data)
+                manifest.append({"index": i, "entry": name})
+                yield stream.drain()
+            if entry_order == "completion":
+                # entries are not sorted, the manifest maps them to the requested items
+                zip.writestr("index.json", json.dumps(manifest))
+        yield stream.drain()
+    finally:
+        # stop remaining reads if the client disconnects
+        for task in tasks:
+            task.cancel()
+
+
+async def iterate_finished_tasks(tasks, entry_order):
+    if entry_order == "completion":
+        indices = {task: i for i, task in enumerate(tasks)}
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=indices.get):
+                yield indices[task], task
+    else:
+        for i, task in enumerate(tasks):
+            await asyncio.wait([task])
+            yield i, task
+
+
+def get_batch_entry(
+    i,
+    slide,
+    image_region,
+    image_format,
+    image_quality,
+    image_channels,
+    tile_cache=None,
+    cache_key=None,
+    cache_version=None,
+    output_type=None,
+    channel_windows=None,
+):
+    if isinstance(image_region, EncodedImage):
+        # served from tile cache
+        return f"t{i + 1}.{get_entry_extension(image_format)}", image_region.data
+    try:
+        extension, encoded_image = batch_encode_image(
+            slide,
+            image_region,
+            image_format,
+            image_quality,
+            image_channels,
+            output_type,
+            channel_windows,
+        )
+    except Exception as ex:
+        return get_error_entry(i, ex)
+    if tile_cache is not None and cache_key is not None:
+        tile_cache.put(cache_key, cache_version, encoded_image)
+    return f"t{i + 1}.{extension}", encoded_image.data
+
+
+def get_error_entry(i, ex):
+    # just indicate error --> error entry instead of image
+    return f"t{i + 1}.err", getattr(ex, "message", repr(ex))
+
+
+def get_entry_extension(image_format):
+    return alternative_spellings.get(image_format, image_format)
+
+
+def batch_encode_image(
+    slide,
+    image_region,
+    image_format,
+    image_quality,
+    image_channels,
+    output_type=None,
+    channel_windows=None,
+):
+    if image_region is None:
+        raise HTTPException(status_code=500, detail="Failed to read image region.")
+
+    if image_format in alternative_spellings:
+        image_format = alternative_spellings[image_format]
+
+    if isinstance(image_region, bytes):
+        if is_passthrough_possible(image_region, image_format, image_channels):
+            return image_format, EncodedImage(
+                image_region, supported_image_formats[image_format]
+            )
+        else:
+            image_region = open_encoded_image(image_region, output_type)
+
+    if image_format == "tiff":
+        # return raw image region as tiff
+        narray = process_image_region_raw(image_region, image_channels)
+        mem = io.BytesIO()
+        if narray.shape[0] == 1:
+            tifffile.imwrite(
+                mem, narray, photometric="minisblack", compression="DEFLATE"
+            )
+        else:
+            tifffile.imwrite(
+                mem,
+                narray,
+                photometric="minisblack",
+                planarconfig="separate",
+                compression="DEFLATE",
+            )
+        mem.seek(0)
+    else:
+        if image_format not in supported_image_formats:
+            raise HTTPException(
+                status_code=400,
+                detail="Provided image format parameter not supported",
+            )
+        # return image region
+        # high bit depth images are windowed by slide wide statistics like single tiles
+        img = process_image_region(
+            slide, image_region, image_channels, channel_windows=channel_windows
+        )
+        mem = save_rgb_image(img, image_format, image_quality)
+    return image_format, EncodedImage(
+        mem.getvalue(), supported_image_formats[image_format]
+    )
+
+
+async def batch_cached_get_tile(
+    tile_cache,
+    cache_key,
+    slide_version,
+    slide,
+    slide_info,
+    level,
+    tile_x,
+    tile_y,
+    image_channels,
+    vp_color,
+    z,
+):
+    encoded_image = await tile_cache.get(cache_key, slide_version)
+    if encoded_image is not None:
+        return encoded_image
+    return await batch_safe_get_tile(
+        slide, slide_info, level, tile_x, tile_y, image_channels, vp_color, z
+    )
+
+
+async def batch_get_thumbnail(slide, max_x, max_y, encoded_image=None):
+    if encoded_image is not None:
+        # served from tile cache
+        return encoded_image
+    if slide is None:
+        raise HTTPException(status_code=404, detail="Failed to open slide.")
+    return await slide.get_thumbnail(max_x, max_y)
 
 
 async def batch_safe_get_region(
@@ -138,7 +367,7 @@ async def batch_safe_get_region(
         return await slide.get_region(
             level, start_x, start_y, size_x, size_y, padding_color=vp_color, z=z
         )
-    except Exception as e:
+    except Exception:
         return None
 
 
@@ -157,5 +386,5 @@ async def batch_safe_get_tile(
         #         slide.get_tile, slide_info, level, tile_x, tile_y, padding_color=vp_color, z=z)
         tile = await slide.get_tile(level, tile_x, tile_y, padding_color=vp_color, z=z)
         return tile
-    except Exception as e:
+    except Exception:
         return None
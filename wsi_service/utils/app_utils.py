@@ -1,4 +1,5 @@
 import re
+from collections import namedtuple
 from io import BytesIO
 
 import numpy as np
@@ -9,12 +10,16 @@ from starlette.responses import Response
 
 from wsi_service.singletons import settings
 from wsi_service.utils.image_utils import (
+    composite_channels,
     convert_narray_to_pil_image,
+    convert_narray_to_uint8_by_channel,
     convert_rgb_image_for_channels,
     get_requested_channels_as_array,
     get_requested_channels_as_rgb_array,
+    open_encoded_image,
     save_rgb_image,
 )
+from wsi_service.utils.raw_tile_utils import sniff_image_format
 
 supported_image_formats = {
     "bmp": "image/bmp",
@@ -22,12 +27,25 @@ supported_image_formats = {
     "jpeg": "image/jpeg",
     "png": "image/png",
     "tiff": "image/tiff",
+    "webp": "image/webp",
+    "jp2": "image/jp2",
 }
 
 alternative_spellings = {"jpg": "jpeg", "tif": "tiff"}
 
+# channels blended into one RGB image with a color and an intensity window each
+ChannelComposition = namedtuple(
+    "ChannelComposition", ["channels", "colors", "window_min", "window_max"]
+)
+
 
-def process_image_region(slide, image_region, image_channels):
+def process_image_region(
+    slide, image_region, image_channels, composition=None, channel_windows=None
+):
+    if composition is not None:
+        return convert_narray_to_pil_image(
+            get_composite_array(image_region, composition)
+        )
     if isinstance(image_region, Image.Image):
         # pillow image
         if image_channels is None:
@@ -39,6 +57,10 @@ def process_image_region(slide, image_region, image_channels):
         if image_channels is None:
             # workaround for now: we return first three channels as rgb
             result = get_requested_channels_as_rgb_array(image_region, None, slide)
+            if channel_windows is not None:
+                result = convert_narray_to_uint8_by_channel(
+                    result, channel_windows[: result.shape[0]]
+                )
             rgb_image = convert_narray_to_pil_image(result)
             return rgb_image
         else:
@@ -46,6 +68,12 @@ def process_image_region(slide, image_region, image_channels):
                 image_region, image_channels, slide
             )
             mode = "L" if len(image_channels) == 1 else "RGB"
+            if channel_windows is not None:
+                # same window for every tile of the slide, no per tile contrast stretch
+                result = convert_narray_to_uint8_by_channel(
+                    result, [channel_windows[channel] for channel in image_channels]
+                )
+                return convert_narray_to_pil_image(result, mode=mode)
             rgb_image = convert_narray_to_pil_image(
                 result, np.min(result), np.max(result), mode=mode
             )
@@ -57,7 +85,9 @@ def process_image_region(slide, image_region, image_channels):
         )
 
 
-def process_image_region_raw(image_region, image_channels):
+def process_image_region_raw(image_region, image_channels, composition=None):
+    if composition is not None:
+        return get_composite_array(image_region, composition)
     if isinstance(image_region, Image.Image):
         # pillow image
         narray = np.asarray(image_region)
@@ -77,26 +107,61 @@ def process_image_region_raw(image_region, image_channels):
         )
 
 
+def get_composite_array(image_region, composition):
+    if isinstance(image_region, Image.Image):
+        narray = np.asarray(image_region.convert("RGB")).transpose(2, 0, 1)
+    elif isinstance(image_region, (np.ndarray, np.generic)):
+        narray = image_region
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Failed to read region in an appropriate internal representation.",
+        )
+    return composite_channels(
+        get_requested_channels_as_array(narray, composition.channels),
+        composition.colors,
+        composition.window_min,
+        composition.window_max,
+    )
+
+
 def make_response(
-    slide, image_region, image_format, image_quality, image_channels=None
+    slide,
+    image_region,
+    image_format,
+    image_quality,
+    image_channels=None,
+    composition=None,
+    channel_windows=None,
+    output_type=None,
 ):
     if isinstance(image_region, bytes):
-        if image_format == "jpeg":
+        image_format = alternative_spellings.get(image_format, image_format)
+        if composition is None and is_passthrough_possible(
+            image_region, image_format, image_channels
+        ):
             return Response(
                 image_region, media_type=supported_image_formats[image_format]
             )
         else:
-            image_region = Image.open(BytesIO(image_region))
+            image_region = open_encoded_image(image_region, output_type)
     if image_format == "tiff":
         # return raw image region as tiff
-        narray = process_image_region_raw(image_region, image_channels)
+        narray = process_image_region_raw(image_region, image_channels, composition)
         return make_tif_response(narray, image_format)
     else:
         # return image region
-        img = process_image_region(slide, image_region, image_channels)
+        img = process_image_region(
+            slide, image_region, image_channels, composition, channel_windows
+        )
         return make_image_response(img, image_format, image_quality)
 
 
+def is_passthrough_possible(encoded_image, image_format, image_channels):
+    # encoded tiles (e.g. raw jpeg tiles) are returned as they are if no conversion is needed
+    return image_channels is None and sniff_image_format(encoded_image) == image_format
+
+
 def make_image_response(pil_image, image_format, image_quality):
     if image_format in alternative_spellings:
         image_format = alternative_spellings[image_format]
@@ -183,6 +248,69 @@ def validate_image_channels(slide_info, image_channels):
         raise HTTPException(status_code=400, detail="No duplicates allowed in channels")
 
 
+def get_channel_composition(
+    slide_info,
+    image_channels,
+    composite,
+    channel_colors,
+    channel_min,
+    channel_max,
+    channel_windows=None,
+):
+    if not composite:
+        if channel_colors or channel_min or channel_max:
+            raise HTTPException(
+                status_code=400,
+                detail="Channel colors and windows require composite=true",
+            )
+        return None
+    if image_channels is None:
+        image_channels = list(range(len(slide_info.channels)))
+    for name, values in [
+        ("channel_colors", channel_colors),
+        ("channel_min", channel_min),
+        ("channel_max", channel_max),
+    ]:
+        if values is not None and len(values) != len(image_channels):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Number of {name} must match the number of selected channels",
+            )
+    if channel_colors is None:
+        colors = [
+            (
+                slide_info.channels[i].color.r,
+                slide_info.channels[i].color.g,
+                slide_info.channels[i].color.b,
+            )
+            for i in image_channels
+        ]
+    else:
+        colors = [parse_hex_color_string(color) for color in channel_colors]
+    if channel_windows is None:
+        channel_windows = [(None, None)] * len(slide_info.channels)
+    return ChannelComposition(
+        channels=tuple(image_channels),
+        colors=tuple(colors),
+        window_min=tuple(
+            channel_min or [channel_windows[i][0] for i in image_channels]
+        ),
+        window_max=tuple(
+            channel_max or [channel_windows[i][1] for i in image_channels]
+        ),
+    )
+
+
+def parse_hex_color_string(color):
+    match = re.search(r"^#[0-9a-fA-F]{6}$", color)
+    if not match:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid channel color {color}, expected a 24bit hex string (e.g. #FF0000)",
+        )
+    return tuple(int(color[i : i + 2], 16) for i in (1, 3, 5))
+
+
 def validate_image_size(size_x, size_y):
     if size_x * size_y > settings.max_returned_region_size:
         raise HTTPException(
@@ -0,0 +1,31 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: all callers of run with the same key await one shared execution.
+    Nothing is kept once the execution finished, so failures are propagated to all current waiters
+    but a later call with the same key runs again.
+    """
+
+    def __init__(self):
+        self.futures = {}
+
+    def is_running(self, key):
+        return key in self.futures
+
+    async def run(self, key, coroutine_function, *args, **kwargs):
+        future = self.futures.get(key)
+        if future is None:
+            future = asyncio.ensure_future(coroutine_function(*args, **kwargs))
+            self.futures[key] = future
+            future.add_done_callback(lambda f: self._remove(key, f))
+        # a cancelled waiter must not cancel the execution other waiters depend on
+        return await asyncio.shield(future)
+
+    def _remove(self, key, future):
+        if self.futures.get(key) is future:
+            del self.futures[key]
+        if not future.cancelled():
+            # mark exception as retrieved in case all waiters have been cancelled
+            future.exception()
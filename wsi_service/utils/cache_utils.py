@@ -0,0 +1,471 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from starlette.responses import Response
+
+from wsi_service.utils.app_utils import alternative_spellings, make_response
+from wsi_service.utils.image_utils import create_padding_image
+
+EncodedImage = namedtuple("EncodedImage", ["data", "media_type"])
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU cache that is bounded by the summed size of its items instead of their count.
+    The size of an item is determined by get_size (len by default).
+    """
+
+    def __init__(self, max_size_bytes, get_size=len):
+        self.cache = OrderedDict()
+        self.max_size_bytes = max_size_bytes
+        self.get_size = get_size
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.cache:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key][0]
+
+    def put(self, key, item):
+        size = self.get_size(item)
+        if size > self.max_size_bytes:
+            return
+        with self.lock:
+            if key in self.cache:
+                self.size_bytes -= self.cache.pop(key)[1]
+            self.cache[key] = (item, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_size_bytes:
+                _, (_, removed_size) = self.cache.popitem(last=False)
+                self.size_bytes -= removed_size
+
+    def pop(self, key):
+        with self.lock:
+            if key in self.cache:
+                item, size = self.cache.pop(key)
+                self.size_bytes -= size
+                return item
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.size_bytes = 0
+
+    def get_status(self):
+        with self.lock:
+            return {
+                "entries": len(self.cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "size_bytes": self.size_bytes,
+                "max_size_bytes": self.max_size_bytes,
+            }
+
+
+class TTLCache:
+    """
+    LRU cache with a limited number of entries that expire after ttl_seconds.
+    Negative results (e.g. unknown ids) can be stored with put_negative and a shorter TTL.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, negative_ttl_seconds=0):
+        self.cache = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns a tuple (found, is_negative, value)"""
+        entry = self.cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.cache.pop(key, None)
+            self.misses += 1
+            return False, False, None
+        self.cache.move_to_end(key)
+        expires_at, is_negative, value = entry
+        if is_negative:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, is_negative, value
+
+    def put(self, key, value):
+        self._put(key, value, False, self.ttl_seconds)
+
+    def put_negative(self, key, value):
+        self._put(key, value, True, self.negative_ttl_seconds)
+
+    def pop(self, key):
+        self.cache.pop(key, None)
+
+    def get_status(self):
+        return {
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+        }
+
+    def _put(self, key, value, is_negative, ttl_seconds):
+        if ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        self.cache[key] = (time.monotonic() + ttl_seconds, is_negative, value)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+
+class DiskCache:
+    """
+    Persistent key value store in a sqlite database that can be shared by several worker processes.
+    Every entry carries a version (e.g. modification time of the slide file), entries with an outdated
+    version are treated as missing and removed. Least recently used entries are evicted once the
+    stored data exceeds max_size_bytes.
+    """
+
+    # last access times are only written back with this resolution to keep reads cheap
+    access_time_resolution_seconds = 60
+    # number of writes of this process after which the total size is checked again
+    eviction_check_interval = 64
+
+    def __init__(self, path, max_size_bytes):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.thread_state = threading.local()
+        self.writes_since_eviction_check = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        connection = self._get_connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, version TEXT, meta TEXT, "
+            "data BLOB, size INTEGER, atime REAL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+        connection.commit()
+
+    def get(self, key, version):
+        connection = self._get_connection()
+        row = connection.execute("SELECT version, meta, data, atime FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        entry_version, meta, data, atime = row
+        now = time.time()
+        if entry_version != version:
+            self.misses += 1
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            connection.commit()
+            return None
+        if now - atime > self.access_time_resolution_seconds:
+            connection.execute("UPDATE entries SET atime = ? WHERE key = ?", (now, key))
+            connection.commit()
+        self.hits += 1
+        return meta, data
+
+    def put(self, key, version, data, meta=""):
+        if len(data) > self.max_size_bytes:
+            return
+        connection = self._get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, version, meta, data, size, atime) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, version, meta, sqlite3.Binary(data), len(data), time.time()),
+        )
+        connection.commit()
+        self.writes_since_eviction_check += 1
+        if self.writes_since_eviction_check >= self.eviction_check_interval:
+            self.writes_since_eviction_check = 0
+            self.evict()
+
+    def evict(self):
+        connection = self._get_connection()
+        size_bytes = self._get_size_bytes(connection)
+        # evict down to 90% of the budget to avoid evicting on every check
+        while size_bytes > 0.9 * self.max_size_bytes:
+            rows = connection.execute("SELECT key, size FROM entries ORDER BY atime LIMIT 256").fetchall()
+            if not rows:
+                break
+            connection.executemany("DELETE FROM entries WHERE key = ?", [(row[0],) for row in rows])
+            connection.commit()
+            size_bytes -= sum(row[1] for row in rows)
+
+    def get_status(self):
+        connection = self._get_connection()
+        entries = connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size_bytes": self._get_size_bytes(connection),
+            "max_size_bytes": self.max_size_bytes,
+        }
+
+    def _get_size_bytes(self, connection):
+        return connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _get_connection(self):
+        # sqlite connections must not be shared between threads
+        connection = getattr(self.thread_state, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.thread_state.connection = connection
+        return connection
+
+
+class TileCache:
+    """
+    Two-level cache of final encoded image responses (e.g. jpeg tiles). The first level lives in
+    memory of the worker and is bounded by a byte budget (0 disables it). The optional second level
+    is a DiskCache shared by all workers that survives restarts.
+    Entries are stored with the version of the slide file and are only served for the same version.
+    """
+
+    def __init__(self, max_size_bytes, disk_cache=None, executor=None):
+        self.memory_cache = ByteLRUCache(max_size_bytes, get_size=lambda entry: len(entry[1].data))
+        self.disk_cache = disk_cache
+        self.executor = executor
+
+    async def get(self, key, version):
+        if version is None:
+            return None
+        entry = self.memory_cache.get(key)
+        if entry is not None:
+            entry_version, encoded_image = entry
+            if entry_version == version:
+                return encoded_image
+            self.memory_cache.pop(key)
+        if self.disk_cache is not None:
+            disk_entry = await self.executor.run("disk_cache", self.disk_cache.get, repr(key), version)
+            if disk_entry is not None:
+                encoded_image = EncodedImage(disk_entry[1], disk_entry[0])
+                self.memory_cache.put(key, (version, encoded_image))
+                return encoded_image
+
+    async def get_response(self, key, version):
+        encoded_image = await self.get(key, version)
+        if encoded_image is not None:
+            return Response(encoded_image.data, media_type=encoded_image.media_type)
+
+    def put(self, key, version, encoded_image):
+        if version is None:
+            return
+        self.memory_cache.put(key, (version, encoded_image))
+        if self.disk_cache is not None:
+            # writing to disk does not delay the response
+            self.executor.submit(
+                "disk_cache",
+                self.disk_cache.put,
+                repr(key),
+                version,
+                encoded_image.data,
+                encoded_image.media_type,
+            )
+
+    def put_response(self, key, version, response):
+        self.put(key, version, EncodedImage(response.body, response.media_type))
+
+    def get_status(self):
+        status = {"tiles": self.memory_cache.get_status()}
+        if self.disk_cache is not None:
+            status["tiles_disk"] = self.disk_cache.get_status()
+        return status
+
+
+class SlideInfoIndex:
+    """
+    Persistent index of serialized slide infos keyed by storage path and plugin. Entries are
+    only served while modification time and size of the slide file (or folder) are unchanged,
+    so info requests can be answered without opening the slide.
+    """
+
+    def __init__(self, path, max_size_bytes, executor):
+        self.disk_cache = DiskCache(path, max_size_bytes)
+        self.executor = executor
+
+    async def get(self, storage_path, plugin):
+        return await self.executor.run("disk_cache", self._sync_get, storage_path, plugin)
+
+    def put(self, storage_path, plugin, slide_info_json):
+        # writing to disk does not delay the response
+        self.executor.submit("disk_cache", self._sync_put, storage_path, plugin, slide_info_json)
+
+    def get_status(self):
+        return self.disk_cache.get_status()
+
+    def _sync_get(self, storage_path, plugin):
+        try:
+            version = get_file_version(storage_path)
+        except OSError:
+            return None
+        entry = self.disk_cache.get(repr((storage_path, plugin)), version)
+        if entry is not None:
+            return entry[1].decode()
+
+    def _sync_put(self, storage_path, plugin, slide_info_json):
+        try:
+            version = get_file_version(storage_path)
+        except OSError:
+            return
+        self.disk_cache.put(
+            repr((storage_path, plugin)),
+            version,
+            slide_info_json.encode(),
+            "application/json",
+        )
+
+
+async def get_encoded_padding_image(
+    padding_cache, executor, output_type, size_x, size_y, padding_color, image_format, image_quality
+):
+    """
+    Returns the encoded image that only consists of padding (tiles and regions outside of the
+    image), shared by all slides with the same output type. Missing images are encoded in the executor.
+    """
+    key = (
+        output_type,
+        size_x,
+        size_y,
+        tuple(padding_color) if padding_color is not None else None,
+        alternative_spellings.get(image_format, image_format),
+        image_quality,
+    )
+    encoded_image = padding_cache.get(key)
+    if encoded_image is None:
+        encoded_image = await executor.run(
+            "encode", encode_padding_image, output_type, size_x, size_y, padding_color, image_format, image_quality
+        )
+        padding_cache.put(key, encoded_image)
+    return encoded_image
+
+
+def encode_padding_image(output_type, size_x, size_y, padding_color, image_format, image_quality):
+    padding_image = create_padding_image(output_type, size_x, size_y, padding_color)
+    response = make_response(None, padding_image, image_format, image_quality)
+    return EncodedImage(response.body, response.media_type)
+
+
+def make_tile_cache_key(
+    slide_id,
+    plugin,
+    level,
+    tile_x,
+    tile_y,
+    z,
+    image_channels,
+    image_format,
+    image_quality,
+    padding_color,
+    composition=None,
+):
+    return (
+        slide_id,
+        plugin,
+        level,
+        tile_x,
+        tile_y,
+        z,
+        tuple(image_channels) if image_channels is not None else None,
+        alternative_spellings.get(image_format, image_format),
+        image_quality,
+        tuple(padding_color) if padding_color is not None else None,
+        composition,
+    )
+
+
+def make_batch_tile_cache_key(
+    slide_id,
+    plugin,
+    level,
+    tile_x,
+    tile_y,
+    z,
+    image_channels,
+    image_format,
+    image_quality,
+    padding_color,
+):
+    # batch tiles are not extended at the image border, so they differ from single tiles
+    return ("batch",) + make_tile_cache_key(
+        slide_id,
+        plugin,
+        level,
+        tile_x,
+        tile_y,
+        z,
+        image_channels,
+        image_format,
+        image_quality,
+        padding_color,
+    )
+
+
+def make_region_cache_key(
+    slide_id,
+    plugin,
+    level,
+    start_x,
+    start_y,
+    size_x,
+    size_y,
+    z,
+    image_channels,
+    image_format,
+    image_quality,
+    padding_color,
+    composition=None,
+):
+    return (
+        "region",
+        slide_id,
+        plugin,
+        level,
+        start_x,
+        start_y,
+        size_x,
+        size_y,
+        z,
+        tuple(image_channels) if image_channels is not None else None,
+        alternative_spellings.get(image_format, image_format),
+        image_quality,
+        tuple(padding_color) if padding_color is not None else None,
+        composition,
+    )
+
+
+def make_thumbnail_cache_key(slide_id, plugin, max_x, max_y, image_format, image_quality):
+    return (
+        "thumbnail",
+        slide_id,
+        plugin,
+        max_x,
+        max_y,
+        alternative_spellings.get(image_format, image_format),
+        image_quality,
+    )
+
+
+def make_composition_key(composite, channel_colors, channel_min, channel_max):
+    if not composite:
+        return None
+    return tuple(tuple(values) if values is not None else None for values in [channel_colors, channel_min, channel_max])
+
+
+def get_file_version(filepath):
+    # modification time and size identify the state of a slide file (or folder)
+    stat = os.stat(filepath)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
@@ -0,0 +1,69 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from wsi_service.singletons import logger
+
+_thread_state = threading.local()
+
+
+def run_coroutine_blocking(coroutine_function, *args, **kwargs):
+    # plugin coroutines do synchronous work only, each worker thread drives them on a private event loop
+    loop = getattr(_thread_state, "loop", None)
+    if loop is None:
+        loop = asyncio.new_event_loop()
+        _thread_state.loop = loop
+    return loop.run_until_complete(coroutine_function(*args, **kwargs))
+
+
+def _call_and_log_errors(function, *args, **kwargs):
+    try:
+        function(*args, **kwargs)
+    except Exception as e:
+        logger.warning("Background call of %s failed: %s", function, e)
+
+
+class PluginExecutor:
+    """
+    Bounded thread pools (one per plugin) that keep blocking slide access off the event loop.
+    Pool sizes default to default_workers and can be overwritten per plugin name.
+    """
+
+    def __init__(self, default_workers, workers_per_plugin=None, enabled=True):
+        self.default_workers = default_workers
+        self.workers_per_plugin = workers_per_plugin or {}
+        self.enabled = enabled
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def get_pool(self, name):
+        with self.lock:
+            if name not in self.pools:
+                max_workers = max(1, int(self.workers_per_plugin.get(name, self.default_workers)))
+                self.pools[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"wsi-{name}")
+            return self.pools[name]
+
+    async def run(self, name, function, *args, **kwargs):
+        if not self.enabled:
+            return function(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get_pool(name), functools.partial(function, *args, **kwargs))
+
+    async def run_coroutine(self, name, coroutine_function, *args, **kwargs):
+        if not self.enabled:
+            return await coroutine_function(*args, **kwargs)
+        return await self.run(name, run_coroutine_blocking, coroutine_function, *args, **kwargs)
+
+    def submit(self, name, function, *args, **kwargs):
+        # fire and forget, failures are logged but not raised
+        if not self.enabled:
+            return _call_and_log_errors(function, *args, **kwargs)
+        self.get_pool(name).submit(_call_and_log_errors, function, *args, **kwargs)
+
+    def shutdown(self, wait=False):
+        with self.lock:
+            pools = list(self.pools.values())
+            self.pools = {}
+        for pool in pools:
+            pool.shutdown(wait=wait)
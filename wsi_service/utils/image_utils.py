@@ -1,9 +1,14 @@
+import functools
+from collections import namedtuple
 from io import BytesIO
 
 import numpy as np
 from fastapi import HTTPException
 from PIL import Image
 
+# type of the images returned by a slide, padding can be created without reading from it
+ImageOutputType = namedtuple("ImageOutputType", ["is_pil_image", "channels", "dtype"])
+
 
 def rgba_to_rgb_with_background_color(image_rgba, padding_color):
     if (
@@ -34,11 +39,70 @@ def convert_narray_uintX_to_uint8(array, exp=16, lower=None, upper=None):
         if exp > 8:
             upper = (2**exp) / (exp / 4)
 
-    temp_array = np.divide((array - lower), (upper - lower))
-    temp_array = np.clip(temp_array * 255, 0, 255)
+    if array.dtype in [np.uint8, np.uint16]:
+        # a single lookup per pixel in a precomputed table, no float temporaries
+        lookup_table = get_uint8_lookup_table(
+            array.dtype.itemsize * 8, float(lower), float(upper)
+        )
+        return lookup_table[array]
+    # one float32 temporary that is scaled and clipped in place
+    temp_array = np.subtract(array, lower, dtype=np.float32)
+    if upper > lower:
+        temp_array *= 255 / (upper - lower)
+    else:
+        # all values above the bound are mapped to 255
+        temp_array = np.where(temp_array > 0, np.float32(255), np.float32(0))
+    np.clip(temp_array, 0, 255, out=temp_array)
     return temp_array.astype(np.uint8)
 
 
+def convert_narray_to_uint8_by_channel(narray, windows):
+    """
+    Converts the first len(windows) channels of narray to uint8, each with its own
+    (lower, upper) window. Remaining channels stay empty.
+    """
+    if narray.dtype == np.uint8:
+        return narray
+    bits = narray.dtype.itemsize * 8
+    narray_uint8 = np.zeros(narray.shape, dtype=np.uint8)
+    for channel, (lower, upper) in enumerate(windows):
+        narray_uint8[channel] = convert_narray_uintX_to_uint8(
+            narray[channel], bits, max(lower, 0), max(upper, 0)
+        )
+    return narray_uint8
+
+
+def downsample_by_two(source, target, rows_per_block=1024):
+    """
+    Writes the 2 x 2 mean of the uint8 array source (height, width, channels) to target of
+    shape (ceil(height / 2), ceil(width / 2), channels), odd borders are repeated. Rows are
+    processed in blocks, so memory-mapped arrays of any size can be downsampled.
+    """
+    for start in range(0, source.shape[0], 2 * rows_per_block):
+        block = source[start : start + 2 * rows_per_block].astype(np.uint16)
+        if block.shape[0] % 2:
+            block = np.concatenate([block, block[-1:]], axis=0)
+        if block.shape[1] % 2:
+            block = np.concatenate([block, block[:, -1:]], axis=1)
+        block = block[0::2] + block[1::2]
+        block = block[:, 0::2] + block[:, 1::2]
+        target[start // 2 : start // 2 + block.shape[0]] = (block + 2) // 4
+
+
+@functools.lru_cache(maxsize=64)
+def get_uint8_lookup_table(bits, lower, upper):
+    values = np.arange(2**bits, dtype=np.float64) - lower
+    if upper > lower:
+        values = values / (upper - lower) * 255
+    else:
+        # all values above the bound are mapped to 255
+        values = np.where(values > 0, 255.0, 0.0)
+    lookup_table = np.clip(values, 0, 255).astype(np.uint8)
+    # tables are shared between requests
+    lookup_table.flags.writeable = False
+    return lookup_table
+
+
 def convert_int_to_rgba_array(i):
     return [(i >> 24) & 0xFF, (i >> 16) & 0xFF, (i >> 8) & 0xFF, i & 0xFF]
 
@@ -103,32 +167,67 @@ def convert_narray_to_pil_image(narray, lower=None, upper=None, mode="RGB"):
         )
 
 
+pil_image_formats = {"jp2": "JPEG2000"}
+
+
 def save_rgb_image(pil_image, image_format, image_quality):
     mem = BytesIO()
-    pil_image.save(mem, format=image_format, quality=image_quality)
+    pil_image.save(
+        mem,
+        format=pil_image_formats.get(image_format, image_format),
+        quality=image_quality,
+    )
     mem.seek(0)
     return mem
 
 
 def get_requested_channels_as_rgb_array(narray, image_channels, slide):
-    separate_channels = np.vsplit(narray, narray.shape[0])
-
-    temp_array = []
     if image_channels is not None and len(image_channels) == 1:
         # edge case 1: single channel will be converted to a grayscale image
-        return separate_channels[image_channels[0]]
+        return get_requested_channels_as_array(narray, image_channels)
     elif image_channels is not None and len(image_channels) == 2:
         # edge case 2: we cast two dedicated image to an rgb image if requested
-        temp_array.append(separate_channels[image_channels[0]])
-        temp_array.append(separate_channels[image_channels[1]])
-        temp_array.append(np.zeros(separate_channels[image_channels[0]].shape))
+        # (single allocation of the source dtype, the third channel stays empty)
+        result = np.zeros((3,) + narray.shape[1:], dtype=narray.dtype)
+        result[0] = narray[image_channels[0]]
+        result[1] = narray[image_channels[1]]
+        return result
     else:
         # three or more channels given
-        # in this case we simply return the first 3 channels for now
-        temp_array = get_multi_channel_as_rgb(separate_channels)
-
-    result = np.concatenate(temp_array, axis=0)
-    return result
+        # in this case we simply return the first 3 channels for now (view, no copy)
+        return narray[:3]
+
+
+def composite_channels(narray, colors, window_min, window_max):
+    """
+    Blends all channels of narray (channel, height, width) additively into an RGB image
+    (3, height, width, uint8). Every channel is windowed to [window_min, window_max] and
+    tinted with its RGB color. Missing window bounds default to the full range for 8 bit
+    data and to the channel's min/max otherwise.
+    """
+    narray = np.asarray(narray)
+    lower = np.empty(narray.shape[0], dtype=np.float32)
+    upper = np.empty(narray.shape[0], dtype=np.float32)
+    for i in range(narray.shape[0]):
+        if window_min[i] is not None:
+            lower[i] = window_min[i]
+        else:
+            lower[i] = 0 if narray.dtype == np.uint8 else narray[i].min()
+        if window_max[i] is not None:
+            upper[i] = window_max[i]
+        else:
+            upper[i] = 255 if narray.dtype == np.uint8 else narray[i].max()
+    scale = 1 / np.maximum(upper - lower, np.finfo(np.float32).eps)
+    normalized = np.subtract(narray, lower[:, None, None], dtype=np.float32)
+    normalized *= scale[:, None, None]
+    np.clip(normalized, 0, 1, out=normalized)
+    # one matrix product blends all channels: (channel, rgb) x (channel, pixel)
+    color_matrix = np.asarray(colors, dtype=np.float32) / 255
+    rgb = np.tensordot(color_matrix, normalized, axes=(0, 0))
+    rgb *= 255
+    np.clip(rgb, 0, 255, out=rgb)
+    np.rint(rgb, out=rgb)
+    return rgb.astype(np.uint8)
 
 
 def get_multi_channel_as_rgb(separate_channels):
@@ -151,15 +250,15 @@ def get_single_channel(separate_channels, channel, color):
 
 
 def get_requested_channels_as_array(narray, image_channels):
-    if narray.shape[0] == len(image_channels):
+    image_channels = list(image_channels)
+    if image_channels == list(range(narray.shape[0])):
         return narray
-
-    separate_channels = np.vsplit(narray, narray.shape[0])
-    temp_array = []
-    for i in image_channels:
-        temp_array.append(separate_channels[i])
-    result = np.concatenate(temp_array, axis=0)
-    return result
+    start = image_channels[0]
+    if image_channels == list(range(start, start + len(image_channels))):
+        # consecutive channels are returned as view
+        return narray[start : start + len(image_channels)]
+    # otherwise a single copy of the requested channels
+    return np.take(narray, image_channels, axis=0)
 
 
 def check_complete_region_overlap(slide_info, level, start_x, start_y, size_x, size_y):
@@ -171,6 +270,43 @@ def check_complete_region_overlap(slide_info, level, start_x, start_y, size_x, s
     )
 
 
+def check_region_outside_image(slide_info, level, start_x, start_y, size_x, size_y):
+    return not (
+        (start_x + size_x > 0 and start_x < slide_info.levels[level].extent.x)
+        and (start_y + size_y > 0 and start_y < slide_info.levels[level].extent.y)
+    )
+
+
+def get_image_output_type(image):
+    if isinstance(image, bytes):
+        image = Image.open(BytesIO(image))
+    if isinstance(image, Image.Image):
+        return ImageOutputType(True, 3, np.dtype(np.uint8))
+    return ImageOutputType(False, image.shape[0], image.dtype)
+
+
+def open_encoded_image(encoded_image, output_type=None):
+    """
+    Decodes an encoded tile. Tiles of slides that return their images as arrays are decoded
+    to an array of shape (channels, y, x), so channels are selected like in their regions.
+    """
+    image = Image.open(BytesIO(encoded_image))
+    if image.mode not in ["RGB", "L"]:
+        image = image.convert("RGB")
+    if output_type is None or output_type.is_pil_image:
+        return image
+    narray = np.asarray(image)
+    if narray.ndim == 2:
+        return narray[np.newaxis]
+    return np.ascontiguousarray(narray.transpose(2, 0, 1))
+
+
+def create_padding_image(output_type, size_x, size_y, padding_color):
+    if output_type.is_pil_image:
+        return Image.new("RGB", (size_x, size_y), padding_color)
+    return np.zeros((output_type.channels, size_y, size_x), dtype=output_type.dtype)
+
+
 async def get_extended_region(
     get_region,
     slide_info,
@@ -181,11 +317,12 @@ async def get_extended_region(
     size_y,
     padding_color=None,
     z=0,
+    output_type=None,
 ):
     # check overlap of requested region and slide
-    overlap = (
-        start_x + size_x > 0 and start_x < slide_info.levels[level].extent.x
-    ) and (start_y + size_y > 0 and start_y < slide_info.levels[level].extent.y)
+    overlap = not check_region_outside_image(
+        slide_info, level, start_x, start_y, size_x, size_y
+    )
     # get overlapping region if there is an overlap
     if overlap:
         if start_x < 0:
@@ -219,19 +356,13 @@ async def get_extended_region(
         )
     # create empty region based on returned region data type
     if overlap:
-        image_region_sample = image_region_overlap
-    else:
-        image_region_sample = await get_region(0, 0, 0, 1, 1)
-    if isinstance(image_region_sample, Image.Image):
-        image_region = Image.new("RGB", (size_x, size_y), padding_color)
-    else:
-        image_region = np.zeros(
-            (image_region_sample.shape[0], size_y, size_x),
-            dtype=image_region_sample.dtype,
-        )
+        output_type = get_image_output_type(image_region_overlap)
+    elif output_type is None:
+        output_type = get_image_output_type(await get_region(0, 0, 0, 1, 1))
+    image_region = create_padding_image(output_type, size_x, size_y, padding_color)
     # insert overlapping region into empty region
     if overlap:
-        if isinstance(image_region_sample, Image.Image):
+        if output_type.is_pil_image:
             image_region.paste(
                 image_region_overlap,
                 box=(
@@ -258,8 +389,24 @@ def check_complete_tile_overlap(slide_info, level, tile_x, tile_y):
     )
 
 
+def check_tile_outside_image(slide_info, level, tile_x, tile_y):
+    return (
+        tile_x < 0
+        or tile_y < 0
+        or tile_x * slide_info.tile_extent.x >= slide_info.levels[level].extent.x
+        or tile_y * slide_info.tile_extent.y >= slide_info.levels[level].extent.y
+    )
+
+
 async def get_extended_tile(
-    get_tile, slide_info, level, tile_x, tile_y, padding_color=None, z=0
+    get_tile,
+    slide_info,
+    level,
+    tile_x,
+    tile_y,
+    padding_color=None,
+    z=0,
+    output_type=None,
 ):
     overlap_size_x = (
         slide_info.levels[level].extent.x - tile_x * slide_info.tile_extent.x
@@ -267,37 +414,25 @@ async def get_extended_tile(
     overlap_size_y = (
         slide_info.levels[level].extent.y - tile_y * slide_info.tile_extent.y
     )
-    overlap = tile_x >= 0 and tile_y >= 0 and overlap_size_x > 0 and overlap_size_y > 0
+    overlap = not check_tile_outside_image(slide_info, level, tile_x, tile_y)
     # get overlapping tile if there is an overlap
     if overlap:
         image_tile_overlap = await get_tile(
             level, tile_x, tile_y, padding_color=padding_color, z=z
         )
         if isinstance(image_tile_overlap, bytes):
-            image_tile_overlap = Image.open(BytesIO(image_tile_overlap))
+            image_tile_overlap = open_encoded_image(image_tile_overlap, output_type)
     # create empty tile based on returned tile data type
     if overlap:
-        image_tile_sample = image_tile_overlap
-    else:
-        image_tile_sample = await get_tile(0, 0, 0)
-        if isinstance(image_tile_sample, bytes):
-            image_tile_sample = Image.open(BytesIO(image_tile_sample))
-    if isinstance(image_tile_sample, Image.Image):
-        image_tile = Image.new(
-            "RGB", (slide_info.tile_extent.x, slide_info.tile_extent.y), padding_color
-        )
-    else:
-        image_tile = np.zeros(
-            (
-                image_tile_sample.shape[0],
-                slide_info.tile_extent.x,
-                slide_info.tile_extent.y,
-            ),
-            dtype=image_tile_sample.dtype,
-        )
+        output_type = get_image_output_type(image_tile_overlap)
+    elif output_type is None:
+        output_type = get_image_output_type(await get_tile(0, 0, 0))
+    image_tile = create_padding_image(
+        output_type, slide_info.tile_extent.x, slide_info.tile_extent.y, padding_color
+    )
     # insert overlapping tile into empty tile
     if overlap:
-        if isinstance(image_tile_sample, Image.Image):
+        if output_type.is_pil_image:
             image_tile.paste(
                 image_tile_overlap.crop((0, 0, overlap_size_x, overlap_size_y)),
                 box=(
@@ -0,0 +1,203 @@
+import os
+import struct
+
+import numpy as np
+
+# tiff compression schemes whose tiles can be served without decoding
+raw_tile_formats = {
+    7: "jpeg",  # JPEG
+    33003: "jp2",  # Aperio JPEG 2000 YCbCr
+    33005: "jp2",  # Aperio JPEG 2000 RGB
+    34712: "jp2",  # JPEG 2000
+    50001: "webp",  # WebP
+}
+
+PHOTOMETRIC_YCBCR = 6
+PLANARCONFIG_CONTIG = 1
+
+
+def get_raw_tile_format(page):
+    """
+    Returns the image format (jpeg, jp2, webp) of the encoded tiles of a tiff page
+    if they can be served as they are, None otherwise.
+    """
+    keyframe = page.keyframe
+    if (
+        not keyframe.is_tiled
+        or keyframe.tiledepth > 1
+        or keyframe.samplesperpixel != 3
+        or keyframe.bitspersample != 8
+        or keyframe.planarconfig != PLANARCONFIG_CONTIG
+    ):
+        return None
+    return raw_tile_formats.get(int(keyframe.compression))
+
+
+def get_raw_tile_page(tif_level, tile_extent):
+    """
+    Returns the page of a tifffile pyramid level if its native tile grid matches the tile
+    extent of the slide and its tiles can be served without decoding, None otherwise.
+    """
+    if tif_level is None or len(tif_level.pages) != 1:
+        return None
+    page = tif_level.pages[0]
+    keyframe = page.keyframe
+    if get_raw_tile_format(page) is None:
+        return None
+    if keyframe.tilewidth != tile_extent.x or keyframe.tilelength != tile_extent.y:
+        return None
+    return page
+
+
+def get_raw_tile(page, tile_x, tile_y, lock=None):
+    """
+    Reads the encoded tile at tile_x, tile_y of a page returned by get_raw_tile_page
+    and returns it as a self-contained jpeg, jp2 or webp bitstream. Returns None for
+    tiles outside of the image and for empty (sparse) tiles.
+    """
+    data = read_raw_tile(page, tile_x, tile_y, lock)
+    if data is None:
+        return None
+    keyframe = page.keyframe
+    image_format = get_raw_tile_format(page)
+    if image_format == "jpeg":
+        add_jpeg_headers(data, get_jpeg_tables(page), keyframe.photometric)
+    elif image_format == "jp2" and data.startswith(j2k_codestream_signature):
+        is_ycbcr = int(keyframe.compression) == 33003 or keyframe.photometric == PHOTOMETRIC_YCBCR
+        data = wrap_j2k_codestream(data, is_ycbcr)
+    return bytes(data)
+
+
+def read_raw_tile(page, tile_x, tile_y, lock=None):
+    keyframe = page.keyframe
+    tiles_per_line = int(np.ceil(keyframe.imagewidth / keyframe.tilewidth))
+    tiles_per_column = int(np.ceil(keyframe.imagelength / keyframe.tilelength))
+    if not (0 <= tile_x < tiles_per_line and 0 <= tile_y < tiles_per_column):
+        return None
+    index = int(tile_y * tiles_per_line + tile_x)
+    if index >= len(page.dataoffsets):
+        return None
+    offset = page.dataoffsets[index]
+    bytecount = page.databytecounts[index]
+    if bytecount == 0:
+        return None
+    filehandle = page.parent.filehandle
+    file_descriptor = get_file_descriptor(filehandle)
+    if file_descriptor is not None:
+        # positional reads leave the file position untouched, no lock needed
+        return bytearray(os.pread(file_descriptor, bytecount, offset))
+    if lock is None:
+        lock = filehandle.lock
+    # seek + read must not interleave with reads of other threads
+    with lock:
+        filehandle.seek(offset)
+        data = filehandle.read(bytecount)
+    return bytearray(data)
+
+
+def get_file_descriptor(filehandle):
+    """
+    Returns the file descriptor of a tifffile file handle if positional reads are possible,
+    i.e. for regular files that do not start at an offset within another file.
+    """
+    if not hasattr(os, "pread") or not filehandle.is_file or filehandle._offset:
+        return None
+    try:
+        return filehandle.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def get_jpeg_tables(page):
+    jpeg_tables = page.keyframe.jpegtables
+    # older tifffile versions return the tag instead of its value
+    return getattr(jpeg_tables, "value", jpeg_tables)
+
+
+def add_jpeg_headers(data, jpeg_tables, photometric):
+    pos = data.find(b"\xff\xda")
+    if jpeg_tables is not None:
+        # add jpeg tables
+        data[pos:pos] = jpeg_tables[2:-2]
+    # check missing huffman tables
+    if data.find(b"\xff\xc4") < 0:
+        data[pos:pos] = default_huffman_tables
+    if data.find(b"\xff\xee") < 0:
+        # add APP14 data
+        #
+        # Marker: ff ee
+        # Length (14 bytes): 00 0e
+        # Adobe (ASCI): 41 64 6f 62 65
+        # Version (100): 00 64
+        # Flags0: 00 00
+        # Flags1: 00 00
+        # Color transform:
+        # 00 = Unknown (RGB or CMYK)
+        color_transform_value = b"\x00"
+        # 01 = YCbCr
+        if photometric == PHOTOMETRIC_YCBCR:
+            color_transform_value = b"\x01"
+        data[pos:pos] = b"\xff\xee\x00\x0e\x41\x64\x6f\x62\x65\x00\x64\x00\x00\x00\x00" + color_transform_value
+
+
+jp2_signature = b"\x00\x00\x00\x0cjP  \r\n\x87\n"
+j2k_codestream_signature = b"\xff\x4f\xff\x51"
+
+
+def wrap_j2k_codestream(codestream, is_ycbcr=False):
+    # tiff and dicom store raw JPEG 2000 codestreams, clients expect a JP2 file
+    def box(box_type, content):
+        return struct.pack(">I", 8 + len(content)) + box_type + content
+
+    # image size, number of components and bit depth from the SIZ marker segment
+    width, height, offset_x, offset_y = struct.unpack_from(">IIII", codestream, 8)
+    components, bit_depth = struct.unpack_from(">HB", codestream, 40)
+    image_header = box(
+        b"ihdr",
+        struct.pack(
+            ">IIHBBBB",
+            height - offset_y,
+            width - offset_x,
+            components,
+            bit_depth,
+            7,
+            0,
+            0,
+        ),
+    )
+    # enumerated colour space: 16 = sRGB, 17 = greyscale, 18 = sYCC
+    colour_space = 18 if is_ycbcr else 16
+    if components == 1:
+        colour_space = 17
+    colour_specification = box(b"colr", struct.pack(">BBBI", 1, 0, 0, colour_space))
+    return (
+        jp2_signature
+        + box(b"ftyp", b"jp2 " + struct.pack(">I", 0) + b"jp2 ")
+        + box(b"jp2h", image_header + colour_specification)
+        + box(b"jp2c", bytes(codestream))
+    )
+
+
+def get_encoded_frame(data):
+    """
+    Returns an encoded frame (e.g. of a DICOM instance) as self-contained jpeg, jp2 or
+    webp bitstream, None if it is stored in any other format.
+    """
+    if data.startswith(j2k_codestream_signature):
+        data = wrap_j2k_codestream(data)
+    if sniff_image_format(data) is None:
+        return None
+    return bytes(data)
+
+
+def sniff_image_format(data):
+    if data.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if data.startswith(jp2_signature):
+        return "jp2"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+default_huffman_tables = b"\xff\xc4\x00\x1f\x00\x00\x01\x05\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\xff\xc4\x00\xb5\x10\x00\x02\x01\x03\x03\x02\x04\x03\x05\x05\x04\x04\x00\x00\x01\x7d\x01\x02\x03\x00\x04\x11\x05\x12\x21\x31\x41\x06\x13\x51\x61\x07\x22\x71\x14\x32\x81\x91\xa1\x08\x23\x42\xb1\xc1\x15\x52\xd1\xf0\x24\x33\x62\x72\x82\x09\x0a\x16\x17\x18\x19\x1a\x25\x26\x27\x28\x29\x2a\x34\x35\x36\x37\x38\x39\x3a\x43\x44\x45\x46\x47\x48\x49\x4a\x53\x54\x55\x56\x57\x58\x59\x5a\x63\x64\x65\x66\x67\x68\x69\x6a\x73\x74\x75\x76\x77\x78\x79\x7a\x83\x84\x85\x86\x87\x88\x89\x8a\x92\x93\x94\x95\x96\x97\x98\x99\x9a\xa2\xa3\xa4\xa5\xa6\xa7\xa8\xa9\xaa\xb2\xb3\xb4\xb5\xb6\xb7\xb8\xb9\xba\xc2\xc3\xc4\xc5\xc6\xc7\xc8\xc9\xca\xd2\xd3\xd4\xd5\xd6\xd7\xd8\xd9\xda\xe1\xe2\xe3\xe4\xe5\xe6\xe7\xe8\xe9\xea\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8\xf9\xfa"
@@ -1,3 +1,4 @@
+import time
 from collections import OrderedDict
 
 from wsi_service.models.v3.slide import (
@@ -10,9 +11,10 @@ from wsi_service.singletons import logger
 
 
 class ExpiringSlide:
-    def __init__(self, slide, timer=None):
+    def __init__(self, slide):
         self.slide = slide
-        self.timer = timer
+        self.last_access = time.monotonic()
+        self.channel_statistics = None
 
 
 class LRUCache:
@@ -44,6 +46,72 @@ class LRUCache:
         return self.cache.pop(key)
 
 
+class SlideHandleCache(LRUCache):
+    """
+    LRU cache of open slides bounded by the number of entries and by the summed estimated
+    memory and file descriptors of the slides (a budget of 0 is unlimited).
+    The most recently used slide is never evicted, even if it exceeds a budget on its own.
+    """
+
+    def __init__(self, size, max_memory_bytes=0, max_file_descriptors=0):
+        super().__init__(size)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_file_descriptors = max_file_descriptors
+        self.costs = {}
+        self.memory_bytes = 0
+        self.file_descriptors = 0
+
+    def put_item(self, key, item, cost=None):
+        """Returns the list of evicted (key, item) tuples"""
+        if key in self.cache:
+            self.pop_item(key)
+        self.cache[key] = item
+        self.cache.move_to_end(key)
+        self.update_cost(key, cost)
+        return self.evict()
+
+    def update_cost(self, key, cost):
+        if key not in self.cache:
+            return
+        previous_cost = self.costs.pop(key, None)
+        if previous_cost is not None:
+            self.memory_bytes -= previous_cost.memory_bytes
+            self.file_descriptors -= previous_cost.file_descriptors
+        if cost is not None:
+            self.costs[key] = cost
+            self.memory_bytes += cost.memory_bytes
+            self.file_descriptors += cost.file_descriptors
+
+    def pop_item(self, key):
+        self.update_cost(key, None)
+        return self.cache.pop(key)
+
+    def evict(self):
+        removed_items = []
+        while len(self.cache) > 1 and self._is_over_budget():
+            key = next(iter(self.cache))
+            removed_items.append((key, self.pop_item(key)))
+            logger.debug("Removing item from cache: %s", key)
+        return removed_items
+
+    def get_status(self):
+        return {
+            "entries": len(self.cache),
+            "max_entries": self.maxSize,
+            "size_bytes": self.memory_bytes,
+            "max_size_bytes": self.max_memory_bytes,
+            "file_descriptors": self.file_descriptors,
+            "max_file_descriptors": self.max_file_descriptors,
+        }
+
+    def _is_over_budget(self):
+        return (
+            len(self.cache) > self.maxSize
+            or 0 < self.max_memory_bytes < self.memory_bytes
+            or 0 < self.max_file_descriptors < self.file_descriptors
+        )
+
+
 def get_original_levels(level_count, level_dimensions, level_downsamples):
     levels = []
     for level in range(level_count):
@@ -0,0 +1,55 @@
+import numpy as np
+from PIL import Image
+
+# percentiles of the intensities that are used as display window of a channel
+window_percentiles = (0.5, 99.5)
+histogram_bins = 256
+
+
+def get_statistics_level(slide_info, max_pixels):
+    """
+    Returns the highest resolution level with at most max_pixels pixels,
+    the lowest resolution level if all levels are larger.
+    """
+    for level, slide_level in enumerate(slide_info.levels):
+        if slide_level.extent.x * slide_level.extent.y <= max_pixels:
+            return level
+    return len(slide_info.levels) - 1
+
+
+def compute_channel_statistics(image_region, level):
+    """
+    Computes min, max, mean, a histogram and the display window (percentiles) of every
+    channel of a complete pyramid level (pillow image or array of shape (channel, height, width)).
+    """
+    if isinstance(image_region, Image.Image):
+        narray = np.asarray(image_region.convert("RGB")).transpose(2, 0, 1)
+    else:
+        narray = np.asarray(image_region)
+    channels = []
+    for channel_id, channel in enumerate(narray):
+        values = channel.ravel()
+        minimum = float(values.min())
+        maximum = float(values.max())
+        counts, _ = np.histogram(values, bins=histogram_bins, range=(minimum, max(maximum, minimum + 1)))
+        window_min, window_max = np.percentile(values, window_percentiles)
+        channels.append(
+            {
+                "id": channel_id,
+                "min": minimum,
+                "max": maximum,
+                "mean": float(values.mean(dtype=np.float64)),
+                "window_min": float(window_min),
+                "window_max": float(window_max),
+                "histogram": counts.tolist(),
+            }
+        )
+    return {
+        "level": level,
+        "percentiles": list(window_percentiles),
+        "channels": channels,
+    }
+
+
+def get_channel_windows(channel_statistics):
+    return [(channel["window_min"], channel["window_max"]) for channel in channel_statistics["channels"]]
@@ -0,0 +1,74 @@
+import numpy as np
+from PIL import Image
+
+
+def get_thumbnail_size(extent_x, extent_y, max_x, max_y):
+    # the aspect ratio is kept, images are not enlarged
+    scale = min(max_x / extent_x, max_y / extent_y, 1.0)
+    return max(round(extent_x * scale), 1), max(round(extent_y * scale), 1)
+
+
+def get_thumbnail_level(slide_info, size_x, size_y):
+    """
+    Returns the smallest level of the pyramid that is at least as large as the thumbnail.
+    """
+    thumb_level = 0
+    for level, slide_level in enumerate(slide_info.levels):
+        if slide_level.extent.x >= size_x and slide_level.extent.y >= size_y:
+            thumb_level = level
+    return thumb_level
+
+
+def downsample_box(narray, size_x, size_y, channel_axis=0):
+    """
+    Downsamples an image array to size_x x size_y by averaging all source pixels that fall
+    into a target pixel (box filter). Integer data is averaged in integer arithmetic and
+    keeps its dtype, axes that are already small enough are left unchanged.
+    """
+    spatial_axes = [axis for axis in range(narray.ndim) if axis != channel_axis]
+    if np.issubdtype(narray.dtype, np.integer):
+        accumulator_dtype = np.int64
+    else:
+        accumulator_dtype = np.float64
+    result = narray
+    for axis, size in zip(spatial_axes, [size_y, size_x]):
+        length = result.shape[axis]
+        if size >= length:
+            continue
+        starts = (np.arange(size) * length) // size
+        counts = np.diff(np.append(starts, length))
+        counts = counts.reshape([size if i == axis else 1 for i in range(narray.ndim)])
+        sums = np.add.reduceat(result, starts, axis=axis, dtype=accumulator_dtype)
+        if accumulator_dtype == np.int64:
+            result = (sums + counts // 2) // counts
+        else:
+            result = sums / counts
+    return result.astype(narray.dtype, copy=False)
+
+
+def resize_thumbnail_array(narray, max_x, max_y, channel_axis=0):
+    axis_y, axis_x = [axis for axis in range(narray.ndim) if axis != channel_axis]
+    size_x, size_y = get_thumbnail_size(narray.shape[axis_x], narray.shape[axis_y], max_x, max_y)
+    return downsample_box(narray, size_x, size_y, channel_axis)
+
+
+async def get_thumbnail_array(slide, max_x, max_y, channel_axis=0):
+    """
+    Creates the thumbnail of a plugin slide that returns its regions as arrays from the
+    smallest sufficient pyramid level.
+    """
+    slide_info = await slide.get_info()
+    size_x, size_y = get_thumbnail_size(slide_info.extent.x, slide_info.extent.y, max_x, max_y)
+    level = get_thumbnail_level(slide_info, size_x, size_y)
+    extent = slide_info.levels[level].extent
+    region = await slide.get_region(level, 0, 0, extent.x, extent.y)
+    return resize_thumbnail_array(np.asarray(region), max_x, max_y, channel_axis)
+
+
+def get_image_file_thumbnail(filepath, max_x, max_y):
+    with Image.open(filepath) as image:
+        # jpeg images are decoded at a reduced scale (down to 1/8) close to the thumbnail
+        image.draft("RGB", (max_x, max_y))
+        thumbnail = image.convert("RGB")
+    thumbnail.thumbnail((max_x, max_y))
+    return thumbnail
@@ -0,0 +1,153 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from wsi_service.singletons import settings
+from wsi_service.utils.cache_utils import ByteLRUCache, get_file_version
+from wsi_service.utils.raw_tile_utils import get_file_descriptor, get_jpeg_tables
+
+# tiles separated by at most this many bytes in the file are fetched with a single read
+max_read_gap_bytes = 65_536
+max_read_size_bytes = 16_777_216
+
+# decoders (imagecodecs) release the GIL, tiles of a region are decoded in parallel
+decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="wsi-decode")
+
+# decoded tiles of all slides of the worker, overlapping regions reuse them
+decoded_tile_cache = ByteLRUCache(settings.decoded_tile_cache_size_bytes, get_size=lambda tile: tile.nbytes)
+
+
+def get_tile_cache_id(filepath):
+    # tiles are identified by their offset within a version of the file
+    return filepath, get_file_version(filepath)
+
+
+def read_tiled_page_region(
+    page,
+    start_row,
+    start_column,
+    rows,
+    columns,
+    fill_value,
+    lock=None,
+    tile_cache_id=None,
+):
+    """
+    Reads rows x columns pixels starting at start_row, start_column from a tiled tiff page and
+    returns them as array of shape (depth, rows, columns, samples). Regions exceeding the image
+    end at the border of the last tile, tiles missing in the file are filled with fill_value.
+    Decoded tiles are kept in the decoded tile cache if a tile_cache_id is given.
+    """
+    keyframe = page.keyframe
+    tile_height, tile_width = keyframe.tilelength, keyframe.tilewidth
+    end_row = min(start_row + rows, keyframe.imagelength)
+    end_column = min(start_column + columns, keyframe.imagewidth)
+    first_tile_row = start_row // tile_height
+    first_tile_column = start_column // tile_width
+    tile_rows = np.arange(first_tile_row, -(-end_row // tile_height))
+    tile_columns = np.arange(first_tile_column, -(-end_column // tile_width))
+    out = np.full(
+        (
+            keyframe.imagedepth,
+            len(tile_rows) * tile_height,
+            len(tile_columns) * tile_width,
+            keyframe.samplesperpixel,
+        ),
+        fill_value,
+        dtype=keyframe.dtype,
+    )
+    # tile indices and output positions of all tiles of the region
+    tiles_per_line = -(-keyframe.imagewidth // tile_width)
+    indices = (tile_rows[:, None] * tiles_per_line + tile_columns[None, :]).ravel()
+    position_rows = np.repeat((tile_rows - first_tile_row) * tile_height, len(tile_columns))
+    position_columns = np.tile((tile_columns - first_tile_column) * tile_width, len(tile_rows))
+
+    # tiles with identical data (same offset) are read and decoded once
+    tiles = {}
+    dataoffsets, databytecounts = page.dataoffsets, page.databytecounts
+    for index, row, column in zip(indices.tolist(), position_rows.tolist(), position_columns.tolist()):
+        if index >= len(dataoffsets) or databytecounts[index] == 0:
+            continue
+        tile = tiles.setdefault(dataoffsets[index], [index, databytecounts[index], []])
+        tile[2].append((row, column))
+
+    decoded_tiles = {}
+    if tile_cache_id is not None:
+        for offset in tiles:
+            tile = decoded_tile_cache.get((tile_cache_id, offset))
+            if tile is not None:
+                decoded_tiles[offset] = tile
+    offsets = sorted(offset for offset in tiles if offset not in decoded_tiles)
+    if offsets:
+        segments = read_byte_ranges(
+            page.parent.filehandle,
+            [(offset, tiles[offset][1]) for offset in offsets],
+            lock,
+        )
+        jpeg_tables = get_jpeg_tables(page)
+
+        def decode(offset, data):
+            tile, _, _ = page.decode(data, tiles[offset][0], jpegtables=jpeg_tables)
+            return tile
+
+        if len(offsets) > 1:
+            new_tiles = decode_pool.map(decode, offsets, segments)
+        else:
+            new_tiles = [decode(offsets[0], segments[0])]
+        for offset, tile in zip(offsets, new_tiles):
+            decoded_tiles[offset] = tile
+            if tile_cache_id is not None:
+                # cached tiles are shared between requests
+                tile.flags.writeable = False
+                decoded_tile_cache.put((tile_cache_id, offset), tile)
+    for offset, tile in decoded_tiles.items():
+        for row, column in tiles[offset][2]:
+            out[:, row : row + tile_height, column : column + tile_width] = tile
+
+    region_row = start_row - first_tile_row * tile_height
+    region_column = start_column - first_tile_column * tile_width
+    return out[:, region_row : region_row + rows, region_column : region_column + columns]
+
+
+def read_byte_ranges(filehandle, byte_ranges, lock=None):
+    """
+    Reads the (offset, bytecount) ranges, sorted by offset, of a tifffile file handle with
+    as few reads as possible. Returns the data of every range in the same order.
+    """
+    file_descriptor = get_file_descriptor(filehandle)
+    if lock is None:
+        lock = filehandle.lock
+    data = []
+    for group in coalesce_byte_ranges(byte_ranges):
+        group_offset = group[0][0]
+        group_size = group[-1][0] + group[-1][1] - group_offset
+        if file_descriptor is not None:
+            # positional reads leave the file position untouched, no lock needed
+            buffer = os.pread(file_descriptor, group_size, group_offset)
+        else:
+            with lock:
+                filehandle.seek(group_offset)
+                buffer = filehandle.read(group_size)
+        view = memoryview(buffer)
+        for offset, bytecount in group:
+            start = offset - group_offset
+            data.append(bytes(view[start : start + bytecount]))
+    return data
+
+
+def coalesce_byte_ranges(byte_ranges):
+    groups = []
+    group_end = None
+    for offset, bytecount in byte_ranges:
+        if (
+            groups
+            and offset - group_end <= max_read_gap_bytes
+            and offset + bytecount - groups[-1][0][0] <= max_read_size_bytes
+        ):
+            groups[-1].append((offset, bytecount))
+            group_end = max(group_end, offset + bytecount)
+        else:
+            groups.append([(offset, bytecount)])
+            group_end = offset + bytecount
+    return groups
@@ -1,16 +1,33 @@
+import functools
 import glob
 import os
 
 import openslide
+import tifffile
 from fastapi import HTTPException
 
 from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import settings
+from wsi_service.slide import HandleCost, get_cached_images_size
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
+from wsi_service.utils.raw_tile_utils import get_raw_tile, get_raw_tile_page
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
 
 
+@functools.lru_cache(maxsize=1)
+def get_shared_openslide_cache():
+    # decoded tiles of all slides share one cache (OpenSlide >= 4.0, openslide-python >= 1.3)
+    if settings.decoded_tile_cache_size_bytes <= 0 or not hasattr(
+        openslide, "OpenSlideCache"
+    ):
+        return None
+    try:
+        return openslide.OpenSlideCache(settings.decoded_tile_cache_size_bytes)
+    except openslide.OpenSlideError:
+        return None
+
+
 class Slide(BaseSlide):
     supported_vendors = [
         "aperio",
@@ -22,23 +39,41 @@ class Slide(BaseSlide):
         "philips",
         "zeiss",
     ]
+    # formats whose tiles can be read as they are stored with tifffile
+    raw_tile_formats = ["aperio", "generic-tiff"]
+    # default size of the tile cache openslide keeps for each slide
+    openslide_cache_bytes = 32 * 1024 * 1024
 
     async def open(self, filepath):
         self.filepath = self.__check_and_adapt_filepath(filepath)
+        self.tif_slide = None
         await self.open_slide()
         self.format = self.slide.detect_format(self.filepath)
         self.slide_info = self.__get_slide_info_openslide()
-        await self.close()
-        await self.open_slide()
+        self.raw_tile_pages = self.__get_raw_tile_pages()
 
     async def open_slide(self):
         try:
             self.slide = openslide.OpenSlide(self.filepath)
         except openslide.OpenSlideError as e:
             raise HTTPException(status_code=500, detail=f"OpenSlideError: {e}")
+        shared_cache = get_shared_openslide_cache()
+        if shared_cache is not None:
+            self.slide.set_cache(shared_cache)
+            # the shared cache is not part of the costs of a single slide
+            self.openslide_cache_bytes = 0
 
     async def close(self):
         self.slide.close()
+        if self.tif_slide is not None:
+            self.tif_slide.close()
+            self.tif_slide = None
+
+    def get_handle_cost(self):
+        return HandleCost(
+            self.openslide_cache_bytes + get_cached_images_size(self),
+            1 if self.tif_slide is None else 2,
+        )
 
     async def get_info(self):
         return self.slide_info
@@ -79,6 +114,11 @@ class Slide(BaseSlide):
         return self.__get_associated_image("macro")
 
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0):
+        raw_tile_page = self.raw_tile_pages[level]
+        if raw_tile_page is not None:
+            tile_data = get_raw_tile(raw_tile_page, tile_x, tile_y)
+            if tile_data is not None:
+                return tile_data
         return await self.get_region(
             level,
             tile_x * self.slide_info.tile_extent.x,
@@ -97,6 +137,32 @@ class Slide(BaseSlide):
                 filepath = vsf_files[0]
         return filepath
 
+    def __get_raw_tile_pages(self):
+        # levels with a native tile grid matching the tile extent serve encoded tiles directly
+        raw_tile_pages = [None] * len(self.slide_info.levels)
+        if self.format not in self.raw_tile_formats:
+            return raw_tile_pages
+        try:
+            self.tif_slide = tifffile.TiffFile(self.filepath)
+        except Exception:
+            return raw_tile_pages
+        # reads can run concurrently in executor threads, seek + read must not interleave
+        self.tif_slide.filehandle.set_lock(True)
+        tif_levels = [
+            level for serie in self.tif_slide.series for level in serie.levels
+        ]
+        for i, slide_level in enumerate(self.slide_info.levels):
+            for tif_level in tif_levels:
+                if (
+                    tif_level.keyframe.imagewidth == slide_level.extent.x
+                    and tif_level.keyframe.imagelength == slide_level.extent.y
+                ):
+                    raw_tile_pages[i] = get_raw_tile_page(
+                        tif_level, self.slide_info.tile_extent
+                    )
+                    break
+        return raw_tile_pages
+
     def __get_associated_image(self, associated_image_name):
         if associated_image_name not in self.slide.associated_images:
             raise HTTPException(
@@ -1,43 +1,70 @@
+import tempfile
+from threading import Lock
+
+import numpy as np
 from fastapi import HTTPException
 from PIL import Image, UnidentifiedImageError
 
-from wsi_service.models.v3.slide import (
-    SlideExtent,
-    SlideInfo,
-    SlideLevel,
-    SlidePixelSizeNm,
-)
+from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import settings
+from wsi_service.slide import HandleCost, get_cached_images_size
 from wsi_service.slide import Slide as BaseSlide
-from wsi_service.utils.slide_utils import get_rgb_channel_list
+from wsi_service.utils.image_utils import downsample_by_two
+from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
+from wsi_service.utils.thumbnail_utils import (
+    get_image_file_thumbnail,
+    get_thumbnail_level,
+    get_thumbnail_size,
+)
+
+tile_size = 256
+# rows of the image that are converted to RGB and copied to the pyramid at once, so there
+# is no full size RGB copy next to the decoded image (PIL decodes an image only as a whole)
+rows_per_block = 1024
 
 
 class Slide(BaseSlide):
     async def open(self, filepath):
         try:
-            self.slide_image = Image.open(filepath)
+            with Image.open(filepath) as image:
+                width, height = image.size
         except UnidentifiedImageError:
             raise HTTPException(status_code=500, detail="PIL Unidentified Image Error")
-        self.slide_image = Image.open(filepath).convert("RGB")
-        width, height = self.slide_image.size
+        self.filepath = filepath
+        self.pyramid = None
+        self.pyramid_file = None
+        self.pyramid_lock = Lock()
+        # levels are halved until they fit into a single tile
+        level_dimensions = [(width, height)]
+        while max(level_dimensions[-1]) > tile_size:
+            level_width, level_height = level_dimensions[-1]
+            level_dimensions.append(((level_width + 1) // 2, (level_height + 1) // 2))
         channels = get_rgb_channel_list()
         self.slide_info = SlideInfo(
             id="",
             channels=channels,
             channel_depth=8,
             extent=SlideExtent(x=width, y=height, z=1),
-            num_levels=1,
+            num_levels=len(level_dimensions),
             pixel_size_nm=SlidePixelSizeNm(x=-1, y=-1),  # pixel size unknown
-            tile_extent=SlideExtent(x=256, y=256, z=1),
-            levels=[
-                SlideLevel(
-                    extent=SlideExtent(x=width, y=height, z=1), downsample_factor=1.0
-                )
-            ],
+            tile_extent=SlideExtent(x=tile_size, y=tile_size, z=1),
+            levels=get_original_levels(
+                len(level_dimensions),
+                level_dimensions,
+                [float(2**level) for level in range(len(level_dimensions))],
+            ),
         )
 
     async def close(self):
-        self.slide_image.close()
+        self.pyramid = None
+        if self.pyramid_file is not None:
+            self.pyramid_file.close()
+
+    def get_handle_cost(self):
+        # the pyramid is memory-mapped (page cache), only the scratch file stays open
+        return HandleCost(
+            get_cached_images_size(self), 0 if self.pyramid is None else 1
+        )
 
     async def get_info(self):
         return self.slide_info
@@ -47,18 +74,37 @@ class Slide(BaseSlide):
     ):
         if padding_color is None:
             padding_color = settings.padding_color
-        region = self.slide_image.crop(
-            (
-                start_x,
-                start_y,
-                start_x + size_x,
-                start_y + size_y,
+        pyramid_level = self.__get_pyramid()[level]
+        height, width = pyramid_level.shape[:2]
+        # areas outside of the image are black
+        region = np.zeros((size_y, size_x, 3), dtype=np.uint8)
+        x0, y0 = max(start_x, 0), max(start_y, 0)
+        x1, y1 = min(start_x + size_x, width), min(start_y + size_y, height)
+        if x1 > x0 and y1 > y0:
+            region[y0 - start_y : y1 - start_y, x0 - start_x : x1 - start_x] = (
+                pyramid_level[y0:y1, x0:x1]
             )
-        )
-        return region
+        return Image.fromarray(region)
 
     async def get_thumbnail(self, max_x, max_y):
-        thumbnail = self.slide_image.copy()
+        if not hasattr(self, "thumbnail"):
+            max_size = settings.max_thumbnail_size
+            if self.pyramid is None:
+                # images that are not browsed get their thumbnail without a pyramid
+                self.thumbnail = get_image_file_thumbnail(
+                    self.filepath, max_size, max_size
+                )
+            else:
+                size_x, size_y = get_thumbnail_size(
+                    self.slide_info.extent.x,
+                    self.slide_info.extent.y,
+                    max_size,
+                    max_size,
+                )
+                thumb_level = get_thumbnail_level(self.slide_info, size_x, size_y)
+                self.thumbnail = Image.fromarray(np.array(self.pyramid[thumb_level]))
+                self.thumbnail.thumbnail((max_size, max_size))
+        thumbnail = self.thumbnail.copy()
         thumbnail.thumbnail((max_x, max_y))
         return thumbnail
 
@@ -73,6 +119,44 @@ class Slide(BaseSlide):
             z=z,
         )
 
+    def __get_pyramid(self):
+        # built once per handle on first access
+        with self.pyramid_lock:
+            if self.pyramid is None:
+                self.pyramid = self.__build_pyramid()
+            return self.pyramid
+
+    def __build_pyramid(self):
+        # decoded levels are stored in a memory-mapped scratch file instead of process memory
+        shapes = [
+            (level.extent.y, level.extent.x, 3) for level in self.slide_info.levels
+        ]
+        offsets = np.cumsum([0] + [int(np.prod(shape)) for shape in shapes])
+        pyramid_file = tempfile.TemporaryFile(prefix="wsi_service_pil_")
+        try:
+            pyramid_file.truncate(int(offsets[-1]))
+            buffer = np.memmap(pyramid_file, dtype=np.uint8, mode="r+")
+            pyramid = [
+                buffer[start:end].reshape(shape)
+                for start, end, shape in zip(offsets, offsets[1:], shapes)
+            ]
+            with Image.open(self.filepath) as image:
+                image.load()
+                for start in range(0, image.height, rows_per_block):
+                    end = min(start + rows_per_block, image.height)
+                    pyramid[0][start:end] = np.asarray(
+                        image.crop((0, start, image.width, end)).convert("RGB")
+                    )
+            for source, target in zip(pyramid, pyramid[1:]):
+                downsample_by_two(source, target)
+        except OSError as e:
+            pyramid_file.close()
+            raise HTTPException(
+                status_code=500, detail=f"Failed to decode image. [{e}]"
+            )
+        self.pyramid_file = pyramid_file
+        return pyramid
+
     def _get_associated_image(self, associated_image_name):
         raise HTTPException(
             status_code=404,
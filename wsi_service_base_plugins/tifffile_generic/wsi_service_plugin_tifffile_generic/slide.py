@@ -5,7 +5,6 @@ from threading import Lock
 import numpy as np
 import tifffile
 from fastapi import HTTPException
-from skimage import transform, util
 
 from wsi_service.models.v3.slide import (
     SlideChannel,
@@ -17,11 +16,19 @@ from wsi_service.models.v3.slide import (
 from wsi_service.singletons import settings
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.image_utils import convert_int_to_rgba_array
+from wsi_service.utils.raw_tile_utils import get_raw_tile, get_raw_tile_page
 from wsi_service.utils.slide_utils import get_original_levels
+from wsi_service.utils.thumbnail_utils import (
+    get_thumbnail_array,
+    resize_thumbnail_array,
+)
+from wsi_service.utils.tiff_utils import get_tile_cache_id, read_tiled_page_region
 
 
 class Slide(BaseSlide):
     format_kinds = ["GENERIC", "TIFF", "TIF"]
+    # reads on a handle are serialized, concurrent reads use a pool of handles
+    supports_handle_pool = True
 
     async def open(self, filepath):
         self.locker = Lock()
@@ -48,7 +55,9 @@ class Slide(BaseSlide):
             raise HTTPException(
                 status_code=404, detail=f"Failed to load tiff file. [{e}]"
             )
+        self.tile_cache_id = get_tile_cache_id(filepath)
         self.slide_info = self.__get_slide_info_tif()
+        self.raw_tile_pages = self.__get_raw_tile_pages()
 
     async def close(self):
         self.tif_slide.close()
@@ -73,26 +82,11 @@ class Slide(BaseSlide):
         return result
 
     async def get_thumbnail(self, max_x, max_y):
-        thumb_level = len(self.slide_info.levels) - 1
-        for i, level in enumerate(self.slide_info.levels):
-            if level.extent.x < max_x or level.extent.y < max_y:
-                thumb_level = i
-                break
-        level_extent_x = self.slide_info.levels[thumb_level].extent.x
-        level_extent_y = self.slide_info.levels[thumb_level].extent.y
-
-        if max_x > max_y:
-            max_y = max_y * (level_extent_y / level_extent_x)
-        else:
-            max_x = max_x * (level_extent_x / level_extent_y)
-
-        thumbnail_org = await self.get_region(
-            thumb_level, 0, 0, level_extent_x, level_extent_y, settings.padding_color
-        )
-        thumbnail_resized = util.img_as_uint(
-            transform.resize(thumbnail_org, (thumbnail_org.shape[0], max_y, max_x))
-        )
-        return thumbnail_resized
+        if not hasattr(self, "thumbnail"):
+            self.thumbnail = await get_thumbnail_array(
+                self, settings.max_thumbnail_size, settings.max_thumbnail_size
+            )
+        return resize_thumbnail_array(self.thumbnail, max_x, max_y)
 
     async def get_label(self):
         self.__get_associated_image("label")
@@ -101,6 +95,11 @@ class Slide(BaseSlide):
         self.__get_associated_image("macro")
 
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0):
+        raw_tile_page = self.raw_tile_pages[level]
+        if raw_tile_page is not None:
+            tile_data = get_raw_tile(raw_tile_page, tile_x, tile_y, self.locker)
+            if tile_data is not None:
+                return tile_data
         return await self.get_region(
             level,
             tile_x * self.slide_info.tile_extent.x,
@@ -118,6 +117,16 @@ class Slide(BaseSlide):
             detail=f"Associated image {associated_image_name} does not exist.",
         )
 
+    def __get_raw_tile_pages(self):
+        # levels with a native tile grid matching the tile extent serve encoded tiles directly
+        return [
+            get_raw_tile_page(
+                self.__get_tif_level_for_slide_level(level),
+                self.slide_info.tile_extent,
+            )
+            for level in self.slide_info.levels
+        ]
+
     def __get_color_for_channel(self, channel_index, channel_depth, padding_color):
         if channel_depth == 8:
             if padding_color is None:
@@ -197,93 +206,24 @@ class Slide(BaseSlide):
     def __read_region_of_page_tiled(
         self, page, channel_index, start_x, start_y, size_x, size_y, padding_color
     ):
-        page_frame = page.keyframe
-        image_width, image_height = page_frame.imagewidth, page_frame.imagelength
-
-        tile_width, tile_height = page_frame.tilewidth, page_frame.tilelength
-        end_x = (
-            (start_x + size_x) if (start_x + size_x) < image_height else image_height
-        )
-        end_y = (start_y + size_y) if (start_y + size_y) < image_width else image_width
-
-        start_tile_x0, start_tile_y0 = start_x // tile_height, start_y // tile_width
-        end_tile_xn, end_tile_yn = np.ceil(
-            [end_x / tile_height, end_y / tile_width]
-        ).astype(int)
-
-        tile_per_line = int(np.ceil(image_width / tile_width))
-
-        # initialize array with size of all relevant tiles
-        out = np.full(
-            (
-                page_frame.imagedepth,
-                (end_tile_xn - start_tile_x0) * tile_height,
-                (end_tile_yn - start_tile_y0) * tile_width,
-                page_frame.samplesperpixel,
-            ),
-            self.__get_color_for_channel(
-                channel_index, self.slide_info.channel_depth, padding_color
-            ),
-            dtype=page_frame.dtype,
-        )
-        fh = page.parent.filehandle
-
-        if fh is None:
+        if page.parent.filehandle is None:
             raise HTTPException(
                 status_code=422,
                 detail="Could not read from tiff file. File handle is null",
             )
-
-        jpegtables = page.jpegtables
-        if jpegtables is not None:
-            jpegtables = jpegtables.value
-
-        used_offsets = []
-        # iterate through tiles starting at the top left to the bottom right
-        for i in range(start_tile_x0, end_tile_xn):
-            for j in range(start_tile_y0, end_tile_yn):
-                with self.locker:
-                    index = int(i * tile_per_line + j)
-
-                    if len(page.dataoffsets) <= index:
-                        continue
-
-                    offset = page.dataoffsets[index]
-                    bytecount = page.databytecounts[index]
-
-                    if offset in used_offsets:
-                        continue
-
-                    used_offsets.append(offset)
-
-                    # search to tile offset and read image tile
-                    fh.seek(offset)
-                    if fh.tell() != offset:
-                        raise HTTPException(
-                            status_code=500, detail="Failed reading to tile offset"
-                        )
-                    data = fh.read(bytecount)
-                    tile, _, _ = page.decode(data, index, jpegtables=jpegtables)
-
-                    # insert tile in temporary output array
-                    tile_position_i = (i - start_tile_x0) * tile_height
-                    tile_position_j = (j - start_tile_y0) * tile_width
-
-                    out[
-                        :,
-                        tile_position_i : tile_position_i + tile_height,
-                        tile_position_j : tile_position_j + tile_width :,
-                    ] = tile
-
-        # determine the new start positions of our region
-        new_start_x = start_x - start_tile_x0 * tile_height
-        new_start_y = start_y - start_tile_y0 * tile_width
-
-        # restrict the output array to the requested region
-        result = out[
-            :, new_start_x : new_start_x + size_x, new_start_y : new_start_y + size_y :
-        ]
-        return result
+        # start_x and size_x address rows, start_y and size_y columns of the page
+        return read_tiled_page_region(
+            page,
+            start_x,
+            start_y,
+            size_x,
+            size_y,
+            self.__get_color_for_channel(
+                channel_index, self.slide_info.channel_depth, padding_color
+            ),
+            self.locker,
+            self.tile_cache_id,
+        )
 
     def __get_levels_tif(self, tif_slide):
         levels = tif_slide.series[self.series_index].levels
@@ -1,30 +1,41 @@
 import numpy as np
 import tiffslide
 from fastapi import HTTPException
+from PIL import Image
 
 from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import settings
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
+from wsi_service.utils.raw_tile_utils import get_raw_tile, get_raw_tile_page
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
+from wsi_service.utils.tiff_utils import get_tile_cache_id, read_tiled_page_region
 
 
 class Slide(BaseSlide):
     supported_vendors = ["aperio", "hamamatsu", None]
+    # reads on a handle are serialized, concurrent reads use a pool of handles
+    supports_handle_pool = True
 
     async def open(self, filepath):
         self.filepath = filepath
         await self.open_slide()
         self.format = self.slide.detect_format(self.filepath)
         self.slide_info = self.__get_slide_info()
-        self.is_jpeg_compression = self.__is_jpeg_compression()
-        self.color_transform = self.__get_color_transform()
+        self.raw_tile_pages = self.__get_raw_tile_pages()
+        self.tile_cache_id = get_tile_cache_id(self.filepath)
+        self.rgb_tile_pages = [
+            self.__get_rgb_tile_page(level)
+            for level in range(len(self.slide_info.levels))
+        ]
 
     async def open_slide(self):
         try:
             self.slide = tiffslide.TiffSlide(self.filepath)
         except tiffslide.TiffFileError as e:
             raise HTTPException(status_code=500, detail=f"TiffFileError: {e}")
+        # reads can run concurrently in executor threads, seek + read must not interleave
+        self.slide._tifffile.filehandle.set_lock(True)
 
     async def close(self):
         self.slide.close()
@@ -37,6 +48,11 @@ class Slide(BaseSlide):
     ):
         if padding_color is None:
             padding_color = settings.padding_color
+        rgb_tile_page = self.rgb_tile_pages[level]
+        if rgb_tile_page is not None:
+            return self.__read_region_from_tiles(
+                rgb_tile_page, start_x, start_y, size_x, size_y, padding_color
+            )
         downsample_factor = self.slide_info.levels[level].downsample_factor
         level_0_location = (
             (int)(start_x * downsample_factor),
@@ -71,24 +87,67 @@ class Slide(BaseSlide):
         return self.__get_associated_image("macro")
 
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0):
-        if self.is_jpeg_compression:
-            tif_level = self.__get_tif_level_for_slide_level(level)
-            page = tif_level.pages[0]
-            tile_data = await self.__read_raw_tile(page, tile_x, tile_y)
-            self.__add_jpeg_headers(page, tile_data, self.color_transform)
-            return bytes(tile_data)
-        else:
-            return await self.get_region(
-                level,
-                tile_x * self.slide_info.tile_extent.x,
-                tile_y * self.slide_info.tile_extent.y,
-                self.slide_info.tile_extent.x,
-                self.slide_info.tile_extent.y,
-                padding_color,
+        raw_tile_page = self.raw_tile_pages[level]
+        if raw_tile_page is not None:
+            tile_data = get_raw_tile(
+                raw_tile_page, tile_x, tile_y, self.slide._tifffile.filehandle.lock
             )
+            if tile_data is not None:
+                return tile_data
+        return await self.get_region(
+            level,
+            tile_x * self.slide_info.tile_extent.x,
+            tile_y * self.slide_info.tile_extent.y,
+            self.slide_info.tile_extent.x,
+            self.slide_info.tile_extent.y,
+            padding_color,
+        )
 
     # private
 
+    def __get_rgb_tile_page(self, level):
+        # tiled 8 bit RGB levels are read with the decoded tile cache instead of zarr
+        tif_level = self.__get_tif_level_for_slide_level(level)
+        if tif_level is None or len(tif_level.pages) != 1:
+            return None
+        page = tif_level.pages[0]
+        keyframe = page.keyframe
+        if (
+            not keyframe.is_tiled
+            or keyframe.dtype != np.uint8
+            or keyframe.samplesperpixel != 3
+            or keyframe.imagedepth != 1
+        ):
+            return None
+        return page
+
+    def __read_region_from_tiles(
+        self, page, start_x, start_y, size_x, size_y, padding_color
+    ):
+        width, height = page.keyframe.imagewidth, page.keyframe.imagelength
+        region = np.empty((size_y, size_x, 3), dtype=np.uint8)
+        region[:] = padding_color
+        x0, y0 = max(start_x, 0), max(start_y, 0)
+        x1, y1 = min(start_x + size_x, width), min(start_y + size_y, height)
+        if x1 > x0 and y1 > y0:
+            try:
+                tiles = read_tiled_page_region(
+                    page,
+                    y0,
+                    x0,
+                    y1 - y0,
+                    x1 - x0,
+                    0,
+                    self.slide._tifffile.filehandle.lock,
+                    self.tile_cache_id,
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"TiffFileError: {e}")
+            region[y0 - start_y : y1 - start_y, x0 - start_x : x1 - start_x] = tiles[
+                0, : y1 - y0, : x1 - x0
+            ]
+        return Image.fromarray(region)
+
     def __get_tif_level_for_slide_level(self, level):
         slide_level = self.slide_info.levels[level]
         for level in self.slide._tifffile.series[0].levels:
@@ -203,55 +262,14 @@ class Slide(BaseSlide):
             best_level += 1
         return best_level - 1
 
-    def __is_jpeg_compression(self):
-        tif_level = self.__get_tif_level_for_slide_level(0)
-        page = tif_level.pages[0]
-        return page.jpegtables is not None
-
-    def __get_color_transform(self):
-        tif_level = self.__get_tif_level_for_slide_level(0)
-        page = tif_level.pages[0]
-        color_transform = "Unknown"
-        if page.photometric == 6:
-            color_transform = "YCbCr"
-        return color_transform
-
-    async def __read_raw_tile(self, page, tile_x, tile_y):
-        image_width = page.keyframe.imagewidth
-        tile_width = page.keyframe.tilewidth
-        tile_per_line = int(np.ceil(image_width / tile_width))
-        index = int(tile_y * tile_per_line + tile_x)
-        offset = page.dataoffsets[index]
-        bytecount = page.databytecounts[index]
-        self.slide._tifffile.filehandle.seek(offset)
-        data = self.slide._tifffile.filehandle.read(bytecount)
-        return bytearray(data)
-
-    def __add_jpeg_headers(self, page, data, color_transform):
-        # add jpeg tables
-        pos = data.find(b"\xff\xda")
-        data[pos:pos] = page.jpegtables[2:-2]
-        # check missing huffman tables
-        if data.find(b"\xff\xc4") < 0:
-            data[pos:pos] = self.__get_default_huffman_tables()
-        # add APP14 data
-        #
-        # Marker: ff ee
-        # Length (14 bytes): 00 0e
-        # Adobe (ASCI): 41 64 6f 62 65
-        # Version (100): 00 64
-        # Flags0: 00 00
-        # Flags1: 00 00
-        # Color transform:
-        # 00 = Unknown (RGB or CMYK)
-        color_transform_value = b"\x00"
-        # 01 = YCbCr
-        if color_transform == "YCbCr":
-            color_transform_value = b"\x01"
-        data[pos:pos] = (
-            b"\xff\xee\x00\x0e\x41\x64\x6f\x62\x65\x00\x64\x00\x00\x00\x00"
-            + color_transform_value
-        )
+    def __get_raw_tile_pages(self):
+        # levels with a native tile grid matching the tile extent serve encoded tiles directly
+        return [
+            get_raw_tile_page(
+                self.__get_tif_level_for_slide_level(level), self.slide_info.tile_extent
+            )
+            for level in range(len(self.slide_info.levels))
+        ]
 
     def __adapt_level_0_location(
         self, level_0_location, downsample_factor, start_x, start_y
@@ -277,8 +295,3 @@ class Slide(BaseSlide):
                 ),
             )
         return level_0_location
-
-    def __get_default_huffman_tables(
-        self,
-    ):
-        return b"\xff\xc4\x00\x1f\x00\x00\x01\x05\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\xff\xc4\x00\xb5\x10\x00\x02\x01\x03\x03\x02\x04\x03\x05\x05\x04\x04\x00\x00\x01\x7d\x01\x02\x03\x00\x04\x11\x05\x12\x21\x31\x41\x06\x13\x51\x61\x07\x22\x71\x14\x32\x81\x91\xa1\x08\x23\x42\xb1\xc1\x15\x52\xd1\xf0\x24\x33\x62\x72\x82\x09\x0a\x16\x17\x18\x19\x1a\x25\x26\x27\x28\x29\x2a\x34\x35\x36\x37\x38\x39\x3a\x43\x44\x45\x46\x47\x48\x49\x4a\x53\x54\x55\x56\x57\x58\x59\x5a\x63\x64\x65\x66\x67\x68\x69\x6a\x73\x74\x75\x76\x77\x78\x79\x7a\x83\x84\x85\x86\x87\x88\x89\x8a\x92\x93\x94\x95\x96\x97\x98\x99\x9a\xa2\xa3\xa4\xa5\xa6\xa7\xa8\xa9\xaa\xb2\xb3\xb4\xb5\xb6\xb7\xb8\xb9\xba\xc2\xc3\xc4\xc5\xc6\xc7\xc8\xc9\xca\xd2\xd3\xd4\xd5\xd6\xd7\xd8\xd9\xda\xe1\xe2\xe3\xe4\xe5\xe6\xe7\xe8\xe9\xea\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8\xf9\xfa"
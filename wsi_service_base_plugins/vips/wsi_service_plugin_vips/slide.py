@@ -6,7 +6,6 @@ from PIL import Image
 import numpy as np
 import pyvips
 from fastapi import HTTPException
-from skimage import transform, util
 
 from wsi_service.models.v3.slide import (
     SlideChannel,
@@ -16,18 +15,31 @@ from wsi_service.models.v3.slide import (
     SlidePixelSizeNm,
 )
 from wsi_service.singletons import settings
+from wsi_service.slide import HandleCost, get_cached_images_size
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
+from wsi_service.utils.thumbnail_utils import (
+    get_thumbnail_array,
+    resize_thumbnail_array,
+)
+
+# recently used operations (e.g. decoded tiles of a level) are kept by libvips and shared
+# by all slides of the process
+pyvips.cache_set_max_mem(settings.vips_cache_max_memory_bytes)
+if settings.vips_cache_max_memory_bytes <= 0:
+    pyvips.cache_set_max(0)
 
 
 class Slide(BaseSlide):
     format_kinds = ["tiffload"]
+    # reads on a handle are serialized, concurrent reads use a pool of handles
+    supports_handle_pool = True
 
     async def open(self, filepath):
         self.locker = Lock()
         try:
-            self.vips_slide = pyvips.Image.new_from_file(filepath, access="sequential")
+            self.vips_slide = pyvips.Image.new_from_file(filepath, access="random")
             if self.vips_slide.get("vips-loader") != "tiffload":
                 raise HTTPException(
                     status_code=500,
@@ -37,6 +49,11 @@ class Slide(BaseSlide):
             raise HTTPException(
                 status_code=404, detail=f"Failed to load tiff file. [{e}]"
             )
+        # levels are opened once for random access and reused by all reads
+        self.vips_levels = [self.vips_slide] + [
+            pyvips.Image.new_from_file(filepath, page=level, access="random")
+            for level in range(1, self.vips_slide.get("n-pages"))
+        ]
         self.slide_info = self.__get_slide_info_tiff()
         # Validate the parsed slide_info to ensure non-zero dimensions
         if self.slide_info.extent.x == 0 or self.slide_info.extent.y == 0:
@@ -50,6 +67,10 @@ class Slide(BaseSlide):
 
     async def close(self):
         self.vips_slide = None
+        self.vips_levels = []
+
+    def get_handle_cost(self):
+        return HandleCost(get_cached_images_size(self), len(self.vips_levels))
 
     async def get_info(self):
         return self.slide_info
@@ -67,11 +88,19 @@ class Slide(BaseSlide):
         if region.interpretation != "srgb":
             region = region.colourspace("srgb")
 
-        result = np.array(region)
+        if region.format == "uchar":
+            # 8 bit data is used as is, without copy or conversion
+            result = np.ndarray(
+                buffer=region.write_to_memory(),
+                dtype=np.uint8,
+                shape=(region.height, region.width, region.bands),
+            )
+        else:
+            result = np.array(region)
 
-        # Check if the data is float and convert to integers
-        if np.issubdtype(result.dtype, np.floating):
-            result = (result * 255).astype(np.uint8)
+            # Check if the data is float and convert to integers
+            if np.issubdtype(result.dtype, np.floating):
+                result = (result * 255).astype(np.uint8)
 
         # Convert grayscale or single-channel to RGB
         if result.ndim == 2:  # Grayscale image
@@ -84,27 +113,14 @@ class Slide(BaseSlide):
         return result
 
     async def get_thumbnail(self, max_x, max_y):
-        thumb_level = len(self.slide_info.levels) - 1
-        for i, level in enumerate(self.slide_info.levels):
-            if level.extent.x < max_x or level.extent.y < max_y:
-                thumb_level = i
-                break
-        level_extent_x = self.slide_info.levels[thumb_level].extent.x
-        level_extent_y = self.slide_info.levels[thumb_level].extent.y
-        if max_x > max_y:
-            max_y = max_y * (level_extent_y / level_extent_x)
-        else:
-            max_x = max_x * (level_extent_x / level_extent_y)
-        # thumbnail_org = self.__get_vips_level_for_slide_level(thumb_level)
-        # return np.array(thumbnail_org)
-
-        thumbnail_org = await self.get_region(
-            thumb_level, 0, 0, level_extent_x, level_extent_y, settings.padding_color
-        )
-        thumbnail_resized = util.img_as_uint(
-            transform.resize(thumbnail_org, (max_y, max_x, thumbnail_org.shape[2]))
-        )
-        return thumbnail_resized
+        if not hasattr(self, "thumbnail"):
+            self.thumbnail = await get_thumbnail_array(
+                self,
+                settings.max_thumbnail_size,
+                settings.max_thumbnail_size,
+                channel_axis=2,
+            )
+        return resize_thumbnail_array(self.thumbnail, max_x, max_y, channel_axis=2)
 
     async def get_label(self):
         self.__get_associated_image("label")
@@ -140,13 +156,10 @@ class Slide(BaseSlide):
         return rgb_color
 
     def __get_vips_level_for_slide_level(self, level):
-        return pyvips.Image.new_from_file(
-            self.vips_slide.filename, page=level, access="sequential"
-        )
+        return self.vips_levels[level]
 
     def __get_levels_tiff(self):
-        num_levels = self.vips_slide.get("n-pages")
-        levels = [self.__get_vips_level_for_slide_level(i) for i in range(num_levels)]
+        levels = self.vips_levels
         level_count = len(levels)
         level_dimensions = []
         level_downsamples = []
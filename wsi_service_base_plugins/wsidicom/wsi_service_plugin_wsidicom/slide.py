@@ -1,11 +1,16 @@
+import math
+import os
+
 from fastapi import HTTPException
 from wsidicom import WsiDicom
 from wsidicom.errors import WsiDicomNotFoundError
 
 from wsi_service.models.v3.slide import SlideExtent, SlideInfo, SlidePixelSizeNm
 from wsi_service.singletons import settings
+from wsi_service.slide import HandleCost, get_cached_images_size
 from wsi_service.slide import Slide as BaseSlide
 from wsi_service.utils.image_utils import rgba_to_rgb_with_background_color
+from wsi_service.utils.raw_tile_utils import get_encoded_frame
 from wsi_service.utils.slide_utils import get_original_levels, get_rgb_channel_list
 
 
@@ -13,8 +18,10 @@ class Slide(BaseSlide):
     async def open(self, filepath):
         await self.open_slide()
         self.slide_info = self.__get_slide_info_dicom()
-        await self.close()
-        await self.open_slide()
+        # wsidicom keeps all instance files of the folder open
+        self.file_count = 1
+        if os.path.isdir(self.filepath):
+            self.file_count = len(os.listdir(self.filepath))
 
     async def open_slide(self):
         try:
@@ -25,6 +32,9 @@ class Slide(BaseSlide):
     async def close(self):
         self.dicom_slide.close()
 
+    def get_handle_cost(self):
+        return HandleCost(get_cached_images_size(self), self.file_count)
+
     async def get_info(self):
         return self.slide_info
 
@@ -72,12 +82,38 @@ class Slide(BaseSlide):
             ) from e
 
     async def get_tile(self, level, tile_x, tile_y, padding_color=None, z=0):
+        if self.__is_native_frame(level, tile_x, tile_y):
+            # stored jpeg and jpeg 2000 frames are returned without decoding
+            tile_data = self.__read_encoded_tile(level, tile_x, tile_y)
+            if tile_data is not None:
+                return tile_data
         level_dicom = self.dicom_slide.levels[level].level
         tile = self.dicom_slide.read_tile(level_dicom, (tile_x, tile_y))
         return rgba_to_rgb_with_background_color(tile, padding_color)
 
     # private
 
+    def __is_native_frame(self, level, tile_x, tile_y):
+        level_dicom = self.dicom_slide.levels[level]
+        tile_size = level_dicom.tile_size
+        if (
+            tile_size.width != self.slide_info.tile_extent.x
+            or tile_size.height != self.slide_info.tile_extent.y
+        ):
+            return False
+        tiles_x = math.ceil(level_dicom.size.width / tile_size.width)
+        tiles_y = math.ceil(level_dicom.size.height / tile_size.height)
+        return 0 <= tile_x < tiles_x and 0 <= tile_y < tiles_y
+
+    def __read_encoded_tile(self, level, tile_x, tile_y):
+        level_dicom = self.dicom_slide.levels[level].level
+        try:
+            data = self.dicom_slide.read_encoded_tile(level_dicom, (tile_x, tile_y))
+        except Exception:
+            # e.g. missing frames of sparse tilings are decoded and padded as before
+            return None
+        return get_encoded_frame(data)
+
     def __get_levels_dicom(self):
         levels = self.dicom_slide.levels
 